@@ -0,0 +1,292 @@
+import argparse
+import os
+import queue
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+
+#Stand-in for the Acuity AR1000, so wespa39-128 can run and be benchmarked without a laser.
+#Answers ID, DM, DS, LO, LF, ST and the DT/DX tracking modes over a pty (Linux/macOS) or a TCP socket.
+#Point laserComPort in the .ini at the printed pty path, or at socket://127.0.0.1:<port>.
+#
+#"printer" listens like a Zebra network printer instead, for printerBackend = tcp.
+#
+#Examples:
+#   python ar1000_sim.py pty --distance 3.048 --noise 0.0005
+#   python ar1000_sim.py tcp --port 4001 --latency 0.08 --dropout 0.05 --error-rate 0.02
+#   python ar1000_sim.py bench --count 200
+#   python ar1000_sim.py printer --port 9100
+
+#Error codes the real laser can send back; see parse_laser_error() in wespa_engine.py
+AR1000_ERRORS = ["E15", "E16", "E17", "E18", "E19", "E23", "E24", "E31",
+                 "E51", "E52", "E53", "E54", "E55", "E61", "E62", "E63", "E64"]
+
+
+class AR1000Simulator:
+    def __init__(self, distance: float = 3.048, noise: float = 0.0005, latency: float = 0.05,
+                 jitter: float = 0.01, dropout: float = 0.0, error_rate: float = 0.0,
+                 errors: list | None = None, track_rate: float = 10.0, fast_track_rate: float = 50.0):
+        self.distance = distance #Meters
+        self.noise = noise #Standard deviation of each reading, meters
+        self.latency = latency #Seconds before answering a command
+        self.jitter = jitter #Latency varies by up to +/- this much
+        self.dropout = dropout #Chance a command gets no answer at all
+        self.error_rate = error_rate #Chance a measurement comes back as an error code
+        self.errors = errors if errors is not None else ["E15", "E16", "E17"]
+        self.track_rate = track_rate #Samples/s in DT mode
+        self.fast_track_rate = fast_track_rate #Samples/s in DX mode
+        self.laser_on = True
+        self.sample_time = 0
+        self.write_lock = threading.Lock()
+        self.streaming = threading.Event()
+        self.write = None
+
+
+    #Serve one connection until read() returns b"" (closed). Blocks the calling thread.
+    def serve(self, read, write):
+        self.write = write
+        buffer = bytearray()
+        while True:
+            try:
+                data = read(256)
+            except OSError:
+                break
+            if not data:
+                break
+
+            for byte in data:
+                #Any character other than a line ending stops tracking output; ESC does nothing else.
+                if byte not in (0x0d, 0x0a) and self.streaming.is_set():
+                    self.streaming.clear()
+                if byte == 0x1b:
+                    continue
+                if byte in (0x0d, 0x0a):
+                    if len(buffer) > 0:
+                        self.handle(buffer.decode("ascii", "replace").strip().upper())
+                        buffer.clear()
+                else:
+                    buffer.append(byte)
+
+        self.streaming.clear()
+
+
+    def send_line(self, text: str):
+        with self.write_lock:
+            try:
+                self.write(bytes(text, "ascii") + b"\r\n")
+            except OSError:
+                self.streaming.clear()
+
+
+    def reading(self):
+        if not self.laser_on:
+            return "E52"
+        if random.random() < self.error_rate:
+            return random.choice(self.errors)
+        return "{0:.4f}".format(self.distance + random.gauss(0.0, self.noise))
+
+
+    def handle(self, command: str):
+        if random.random() < self.dropout:
+            return
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        if command == "ID":
+            self.send_line("AR1000 SIMULATOR")
+        elif command in ("DM", "DS"):
+            self.send_line(self.reading())
+        elif command in ("DT", "DX"):
+            rate = self.track_rate if command == "DT" else self.fast_track_rate
+            self.streaming.set()
+            threading.Thread(target=self.track, args=(rate,), daemon=True).start()
+        elif command == "LO":
+            self.laser_on = True
+            self.send_line("LO")
+        elif command == "LF":
+            self.laser_on = False
+            self.send_line("LF")
+        elif command.startswith("ST"):
+            try:
+                self.sample_time = int(command[2:].strip() or "0")
+                self.send_line("ST" + str(self.sample_time))
+            except ValueError:
+                self.send_line("E61")
+        else:
+            self.send_line("E61")
+
+
+    def track(self, rate: float):
+        while self.streaming.is_set():
+            self.send_line(self.reading())
+            time.sleep(1.0 / rate)
+
+
+#Serve on a pseudo-terminal; pyserial opens the slave side like any other serial port.
+def run_pty(sim: AR1000Simulator):
+    import tty
+    master, slave = os.openpty()
+    #Raw mode so CR/LF pass through untranslated. Keeping slave open stops reads on master failing between clients.
+    tty.setraw(master)
+    tty.setraw(slave)
+    print("AR1000 simulator on " + os.ttyname(slave), flush=True)
+    sim.serve(lambda n: os.read(master, n), lambda data: os.write(master, data))
+
+
+#Serve on a TCP port, one client at a time; use laserComPort = socket://host:port.
+def run_tcp(sim: AR1000Simulator, host: str, port: int, ready: threading.Event | None = None):
+    with socket.create_server((host, port)) as server:
+        print("AR1000 simulator on socket://{0}:{1}".format(host, server.getsockname()[1]), flush=True)
+        if ready is not None:
+            ready.port = server.getsockname()[1]
+            ready.set()
+        while True:
+            conn, address = server.accept()
+            with conn:
+                sim.serve(conn.recv, conn.sendall)
+
+
+#Stand-in for a Zebra network printer (raw port 9100). Prints the fields of every label it receives;
+# use printerBackend = tcp and printerAddress = host:port. --dropout closes the connection after that share of labels.
+def run_printer(host: str, port: int, dropout: float = 0.0):
+    labels = 0
+    with socket.create_server((host, port)) as server:
+        print("Printer on {0}:{1}".format(host, server.getsockname()[1]), flush=True)
+        while True:
+            conn, address = server.accept()
+            print("Connection from {0}:{1}".format(*address), flush=True)
+            with conn:
+                buffer = b""
+                while True:
+                    data = conn.recv(4096)
+                    if not data:
+                        break
+                    buffer += data
+                    closing = False
+                    while b"^XZ" in buffer:
+                        label, buffer = buffer.split(b"^XZ", 1)
+                        text = label.decode("utf-8", "replace")
+                        if "^DF" in text:
+                            print("Stored format " + text.split("^DF", 1)[1].split("^FS", 1)[0], flush=True)
+                            continue
+                        labels += 1
+                        fields = [field.split("^FS", 1)[0] for field in text.split("^FD")[1:]]
+                        copies = text.split("^PQ", 1)[1].split(",", 1)[0] if "^PQ" in text else "1"
+                        print("Label {0}{1}: {2}".format(labels, " x" + copies if copies != "1" else "",
+                                                         " | ".join(fields)), flush=True)
+                        closing = closing or random.random() < dropout
+                    if closing:
+                        print("Dropping connection", flush=True)
+                        break
+
+
+#LaserReader and friends live in wespa_engine.py, next to this file. Imported on demand so the pty and tcp
+# modes don't need pyserial or numpy.
+def load_app():
+    import wespa_engine
+    return wespa_engine
+
+
+def summarize(name: str, latencies: list):
+    if len(latencies) < 2:
+        print("{0:<10} n={1:<5} {2:7.1f}ms".format(name, len(latencies), sum(latencies) * 1000))
+        return
+    cuts = statistics.quantiles(latencies, n=100)
+    print("{0:<10} n={1:<5} mean={2:7.1f}ms  p50={3:7.1f}ms  p95={4:7.1f}ms  max={5:7.1f}ms".format(
+        name, len(latencies), statistics.mean(latencies) * 1000, cuts[49] * 1000, cuts[94] * 1000,
+        max(latencies) * 1000))
+
+
+#Drive the app's LaserReader against the simulator and report latency and throughput.
+def run_bench(sim: AR1000Simulator, count: int, stream_seconds: float):
+    app = load_app()
+    ready = threading.Event()
+    threading.Thread(target=run_tcp, args=(sim, "127.0.0.1", 0, ready), daemon=True).start()
+    ready.wait()
+
+    results = queue.Queue()
+    reader = app.LaserReader("socket://127.0.0.1:{0}".format(ready.port), results)
+
+    start = time.perf_counter()
+    reader.connect()
+    summarize("connect", [time.perf_counter() - start])
+    if not reader.is_connected:
+        print("Could not connect to the simulator.")
+        return
+    print("{0:<10} response timeout {1:.0f}ms (auto-tuned)".format("tune", reader.response_timeout * 1000))
+
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        reader.measure()
+        latencies.append(time.perf_counter() - start)
+    summarize("DM", latencies)
+    if sum(latencies) > 0:
+        print("{0:<10} {1:.1f} readings/s".format("DM", count / sum(latencies)))
+
+    latencies = []
+    for i in range(3):
+        start = time.perf_counter()
+        reader.reset()
+        latencies.append(time.perf_counter() - start)
+    summarize("reset", latencies)
+
+    while not results.empty():
+        results.get_nowait()
+
+    for mode in ("DT", "DX"):
+        reader.mode = mode
+        reader.start_stream()
+        end = time.perf_counter() + stream_seconds
+        while time.perf_counter() < end:
+            reader.read_stream()
+        reader.stop_stream()
+        samples = 0
+        while not results.empty():
+            if results.get_nowait().length is not None:
+                samples += 1
+        print("{0:<10} {1:.1f} readings/s".format(mode, samples / stream_seconds))
+
+    reader.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Acuity AR1000 simulator for wespa39-128.")
+    parser.add_argument("transport", choices=["pty", "tcp", "bench", "printer"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4001)
+    parser.add_argument("--distance", type=float, default=3.048, help="meters")
+    parser.add_argument("--noise", type=float, default=0.0005, help="standard deviation, meters")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="seconds")
+    parser.add_argument("--dropout", type=float, default=0.0, help="chance of no answer, 0-1")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="chance of an error code, 0-1")
+    parser.add_argument("--errors", default="E15,E16,E17", help="comma separated, from " + " ".join(AR1000_ERRORS))
+    parser.add_argument("--count", type=int, default=100, help="bench: DM commands to time")
+    parser.add_argument("--stream-seconds", type=float, default=3.0, help="bench: seconds per tracking mode")
+    args = parser.parse_args()
+
+    errors = [e.strip().upper() for e in args.errors.split(",") if e.strip() != ""]
+    unknown = [e for e in errors if e not in AR1000_ERRORS]
+    if len(unknown) > 0:
+        parser.error("unknown error codes: " + ", ".join(unknown))
+
+    sim = AR1000Simulator(args.distance, args.noise, args.latency, args.jitter,
+                          args.dropout, args.error_rate, errors)
+    try:
+        if args.transport == "pty":
+            run_pty(sim)
+        elif args.transport == "tcp":
+            run_tcp(sim, args.host, args.port)
+        elif args.transport == "printer":
+            run_printer(args.host, args.port, args.dropout)
+        else:
+            run_bench(sim, args.count, args.stream_seconds)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2814 @@
+#The WESPA 39-128 measurement engine: laser and printer workers, barcode decoding, the production journal and
+# each station's tolerance logic. Nothing in here needs a display; wespa39-128.py is the Tk view over it.
+#Run this module directly for a headless station that reads barcodes from stdin or a TCP port (see main()).
+import argparse
+import csv
+import gzip
+import json
+import sqlite3
+import math
+import logging
+import numpy as np
+import os
+import queue
+import random
+import re
+import select
+import socket
+import socketserver
+import sys
+import threading
+import time
+import urllib.request
+import serial
+import serial.tools.list_ports
+
+try:
+    import win32print
+except ImportError:
+    #Windows only; the file printer backend works without it.
+    win32print = None
+
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from configparser import ConfigParser
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from dataclasses import asdict, dataclass, replace
+from functools import lru_cache, total_ordering
+
+#Laser outputs in meters, convert here
+def meters_to_inches(meters: float):
+    return meters * 39.3701
+
+
+#A length held as whole hundredths of an inch. Sums and differences are exact integers, so nothing gets
+# re-rounded on each refresh and a length can never print as "19 FT 12.0 IN".
+@total_ordering
+class Length:
+    __slots__ = ("hundredths",)
+
+    def __init__(self, hundredths: int = 0):
+        self.hundredths = hundredths
+
+
+    #The one place floats (laser filter output, barcodes, config) are rounded into a Length.
+    @classmethod
+    def from_inches(cls, inches: float):
+        return cls(round(inches * 100))
+
+
+    @property
+    def inches(self):
+        return self.hundredths / 100
+
+
+    def __add__(self, other: "Length"):
+        return Length(self.hundredths + other.hundredths)
+
+
+    def __sub__(self, other: "Length"):
+        return Length(self.hundredths - other.hundredths)
+
+
+    def __neg__(self):
+        return Length(-self.hundredths)
+
+
+    def __abs__(self):
+        return Length(abs(self.hundredths))
+
+
+    def __eq__(self, other):
+        return isinstance(other, Length) and self.hundredths == other.hundredths
+
+
+    def __lt__(self, other: "Length"):
+        return self.hundredths < other.hundredths
+
+
+    def __hash__(self):
+        return hash(self.hundredths)
+
+
+    def __repr__(self):
+        return "Length({0})".format(self.hundredths)
+
+
+    #XX FT YY IN, or YY IN if under a foot, e.g. "10 FT 0.5 IN", "-11.99 IN".
+    def __str__(self):
+        return format_hundredths(self.hundredths)
+
+
+#Lengths on a station repeat from one refresh to the next, so the strings are built once and cached.
+@lru_cache(maxsize=4096)
+def format_hundredths(hundredths: int):
+    neg_sign = "-" if hundredths < 0 else ""
+    feet, remainder = divmod(abs(hundredths), 1200)
+    #remainder / 100 prints the same way the old round(inches, 2) did: 0.0, 6.5, 11.99
+    if feet > 0:
+        return "{0}{1} FT {2} IN".format(neg_sign, feet, remainder / 100)
+    else:
+        return "{0}{1} IN".format(neg_sign, remainder / 100)
+
+
+def parse_laser_error(err: str):
+    response = ""
+    match err:
+        case "E15": response = err + ": Sensor slow to respond"
+        case "E16": response = err + ": Too much target reflectance"
+        case "E17": response = err + ": Too much ambient light"
+        case "E18": response = err + ": DX mode: Measured greater than specified range"
+        case "E19": response = err + ": DX mode: Target speed > 10m/s"
+        case "E23": response = err + ": Temp below 14F"
+        case "E24": response = err + ": Temp above 140F"
+        case "E31": response = err + ": Faulty memory hardware, EEPROM error"
+        case "E51": response = err + ": High ambient light or hardware error"
+        case "E52": response = err + ": Faulty laser diode"
+        case "E53": response = err + ": EEPROM parameter not set (or divide by zero error)"
+        case "E54": response = err + ": Hardware error (PLL)"
+        case "E55": response = err + ": Hardware error"
+        case "E61": response = err + ": Invalid serial command"
+        case "E62": response = err + ": Hardware error or Parity error in serial settings"
+        case "E63": response = err + ": SIO Overflow"
+        case "E64": response = err + ": Framing - error SIO"
+        case "LO": response = err + ": Laser is on"
+        case "LF": response = err + ": Laser is off"
+        case '': response = "No response from laser."
+
+    logging.info("Laser status: %s", response)
+
+    return response
+
+
+#Per-stage latency histograms for the scan-to-label path, shared by the GUI and the worker threads.
+#Durations go into log-spaced buckets about 10% wide, so memory stays fixed however long the shift runs.
+#When disabled, start() and stop() return straight away without reading the clock.
+class StageTimer:
+    bucket_growth: float = 1.1
+    smallest_bucket: float = 1e-6 #Seconds; anything faster lands in bucket 0
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {} #stage -> {bucket index: count}
+        self.totals = {} #stage -> [count, total seconds, max seconds]
+
+
+    def start(self):
+        return time.perf_counter() if self.enabled else 0.0
+
+
+    def stop(self, stage: str, start: float):
+        if self.enabled and start > 0.0:
+            self.record(stage, time.perf_counter() - start)
+
+
+    def record(self, stage: str, seconds: float):
+        bucket = 0
+        if seconds > self.smallest_bucket:
+            bucket = int(math.log(seconds / self.smallest_bucket, self.bucket_growth)) + 1
+        with self.lock:
+            histogram = self.histograms.setdefault(stage, {})
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+            totals = self.totals.setdefault(stage, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+
+
+    #Upper edge of the bucket holding the given fraction (0-1) of samples.
+    def percentile(self, histogram: dict, count: int, fraction: float):
+        target = fraction * count
+        seen = 0
+        for bucket in sorted(histogram):
+            seen += histogram[bucket]
+            if seen >= target:
+                return self.smallest_bucket * self.bucket_growth ** bucket
+        return 0.0
+
+
+    def report(self):
+        with self.lock:
+            stages = sorted(self.totals)
+            lines = ["{0:<28}{1:>8}{2:>11}{3:>11}{4:>11}{5:>11}{6:>11}".format(
+                "stage (ms)", "count", "mean", "p50", "p95", "p99", "max")]
+            for stage in stages:
+                count, total, longest = self.totals[stage]
+                histogram = self.histograms[stage]
+                #Bucket edges can overshoot the slowest sample; never report past it.
+                p50, p95, p99 = [min(self.percentile(histogram, count, fraction), longest) for fraction in (0.50, 0.95, 0.99)]
+                lines.append("{0:<28}{1:>8}{2:>11.2f}{3:>11.2f}{4:>11.2f}{5:>11.2f}{6:>11.2f}".format(
+                    stage, count, total / count * 1000, p50 * 1000, p95 * 1000, p99 * 1000, longest * 1000))
+        return "\n".join(lines) + "\n"
+
+
+    def dump(self, path: str):
+        if not self.enabled:
+            return
+        try:
+            with open(path, "w") as f:
+                f.write(self.report())
+            logging.warning("Timings written to %s", path)
+        except OSError as e:
+            logging.error("Error writing timings: %s", e)
+
+
+#Enabled by enableTiming in the [debug] section.
+stage_timer = StageTimer()
+
+
+#Splits the laser's byte stream into CR/LF terminated frames.
+#Bytes accumulate in one reusable buffer, so a frame split across two reads is kept until it completes.
+#Each frame comes back as ("length", meters), ("error", "E15") or ("text", "LO").
+class LaserFrameParser:
+    frame_pattern = re.compile(rb"([^\r\n]*)[\r\n]")
+    error_pattern = re.compile(r"E\d\d")
+    max_frame_size: int = 64 #A longer unterminated run is line noise; drop it
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+
+    def feed(self, data: bytes):
+        self.buffer += data
+        frames = []
+        end = 0
+        for match in self.frame_pattern.finditer(self.buffer):
+            end = match.end()
+            frame = self.parse_frame(match.group(1))
+            if frame is not None:
+                frames.append(frame)
+
+        del self.buffer[:end]
+        if len(self.buffer) > self.max_frame_size:
+            logging.warning("Discarding unterminated laser data: %s", bytes(self.buffer))
+            self.buffer.clear()
+
+        return frames
+
+
+    def parse_frame(self, raw: bytes):
+        text = raw.decode('utf-8', 'replace').strip()
+        if text == "":
+            return None
+        try:
+            return ("length", float(text))
+        except ValueError:
+            pass
+        if self.error_pattern.fullmatch(text):
+            return ("error", text)
+        return ("text", text)
+
+
+    #Forget any partial frame, e.g. before sending a new command.
+    def clear(self):
+        self.buffer.clear()
+
+
+#(status, length in inches, error) for one parsed frame, as the laser worker posts it.
+def frame_reading(frame: tuple):
+    kind, value = frame
+    if kind == "length":
+        return None, meters_to_inches(value), False
+    logging.error("Non-numeric value received from laser: %s", value)
+    return parse_laser_error(value), 0.0, True
+
+
+#Posted by the laser worker to the GUI.
+@dataclass
+class LaserReading:
+    timestamp: float #time.monotonic() when the response was read
+    connected: bool #Link state after this command
+    status: str | None = None #New status line text, None leaves it unchanged
+    length: float | None = None #Raw laser length in inches, None if no measurement
+    error: bool = False #The laser answered with an error instead of a length
+    port: str | None = None #Set when autodiscovery found the laser on a port other than the configured one
+    link_state: str = "disconnected" #connected/reconnecting/disconnected, from the reader's supervisor
+    disconnects: int = 0 #Links lost since the reader started
+    downtime: float = 0.0 #Seconds the link was down, not counting the current outage
+    down_since: float | None = None #time.monotonic() the current outage began, None while connected
+
+
+#Smooths raw laser samples over a rolling window and reports when the reading has settled.
+#Outliers are rejected against the window median (scaled MAD) before smoothing with median, EMA or trimmed mean.
+#A run of stable_samples outliers at the newest end is the table moving rather than noise, so the window restarts
+# from those samples. The reading counts as stable once the newest stable_samples raw samples span no more than
+# stable_spread inches and the smoothed value is within stable_spread of each of them.
+class MeasurementFilter:
+    methods = ("median", "ema", "trimmed")
+    min_mad: float = 0.01 #Inches; stops a run of identical samples from rejecting everything else
+
+    def __init__(self, method: str = "median", window_size: int = 10, stable_samples: int = 3,
+                 stable_spread: float = 0.05, outlier_threshold: float = 3.0,
+                 ema_alpha: float = 0.3, trim_fraction: float = 0.2):
+        if method not in self.methods:
+            raise ValueError("Unknown filter method: " + method)
+        self.method = method
+        self.window = deque(maxlen=window_size)
+        self.stable_samples = stable_samples
+        self.stable_spread = stable_spread
+        self.outlier_threshold = outlier_threshold
+        self.ema_alpha = ema_alpha
+        self.trim_fraction = trim_fraction
+
+
+    def add(self, length: float):
+        self.window.append(length)
+
+
+    def clear(self):
+        self.window.clear()
+
+
+    #True for each sample within outlier_threshold scaled MADs of the median of samples.
+    def inlier_mask(self, samples: np.ndarray):
+        median = np.median(samples)
+        mad = max(np.median(np.abs(samples - median)) * 1.4826, self.min_mad)
+        return np.abs(samples - median) <= self.outlier_threshold * mad
+
+
+    #Returns (smoothed length, stable). The length is None while the window is empty.
+    def evaluate(self):
+        if len(self.window) == 0:
+            return None, False
+
+        samples = np.fromiter(self.window, dtype=np.float64, count=len(self.window))
+        mask = self.inlier_mask(samples)
+        #Outliers since the newest inlier; enough of them in a row means the table moved to a new length.
+        kept = np.flatnonzero(mask)
+        moved = len(samples) - (kept[-1] + 1 if len(kept) > 0 else 0)
+        if moved >= self.stable_samples:
+            samples = samples[-moved:]
+            self.window.clear()
+            self.window.extend(samples.tolist())
+            mask = self.inlier_mask(samples)
+        inliers = samples[mask]
+
+        if self.method == "median":
+            value = np.median(inliers)
+        elif self.method == "ema":
+            #Newest sample gets weight alpha, each older one (1 - alpha) times less.
+            weights = (1.0 - self.ema_alpha) ** np.arange(len(inliers) - 1, -1, -1)
+            value = np.dot(weights, inliers) / weights.sum()
+        else:
+            trim = int(len(inliers) * self.trim_fraction)
+            value = np.sort(inliers)[trim:len(inliers) - trim].mean()
+
+        #Raw samples, so a move the smoothing hasn't caught up with yet is never reported as settled.
+        recent = samples[-self.stable_samples:]
+        stable = (len(recent) >= self.stable_samples and np.ptp(recent) <= self.stable_spread
+                  and np.all(np.abs(recent - value) <= self.stable_spread))
+        return float(value), bool(stable)
+
+
+#Serial settings and timing for one laser. The defaults match the AR1000 as shipped.
+@dataclass
+class LaserProfile:
+    baud_rate: int = 9600
+    sample_time: int | None = None #ST sent after connecting (0 = the laser picks); None leaves the laser's setting
+    response_timeout: float = 1.0 #Longest wait for a DM/DS reply; auto-tune shortens it
+    poll_interval: float = 0.5 #Seconds between polled measurements
+    reset_delay: float = 1.0 #Pause between LF and LO
+    stream_drain: float = 0.1 #Wait for the last tracking frames after stopping a stream; auto-tune shortens it
+    stream_stall_timeout: float = 8.0 #Seconds without a tracking frame before the stream counts as dead
+    auto_tune: bool = True #Time a few measurements after each connect and set the delays from them
+    tune_samples: int = 5
+
+
+#Ask whatever is on port for its ID. Returns the reply line, or "" if nothing answered within timeout.
+def probe_laser_port(port: str, timeout: float = 1.0, baud_rate: int = 9600):
+    try:
+        connection = serial.serial_for_url(port, baudrate=baud_rate, timeout=timeout, write_timeout=timeout)
+    except (serial.SerialException, ValueError, OSError):
+        return ""
+    try:
+        connection.write(b'ID\r\n')
+        return connection.readline().decode('ascii', 'replace').strip()
+    except (serial.SerialException, OSError):
+        return ""
+    finally:
+        connection.close()
+
+
+#Probe every serial port on the machine, except exclude, at the same time and return the first one that answers ID,
+# or None. Takes about one timeout however many ports there are.
+def discover_laser_port(exclude: set, timeout: float = 1.0, baud_rate: int = 9600):
+    ports = [info.device for info in serial.tools.list_ports.comports() if info.device not in exclude]
+    if len(ports) == 0:
+        return None
+    logging.info("Probing %s for the laser", ", ".join(ports))
+    with ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="LaserProbe") as pool:
+        probes = {pool.submit(probe_laser_port, port, timeout, baud_rate): port for port in ports}
+        for probe in as_completed(probes):
+            response = probe.result()
+            if response != "":
+                logging.info("%s answered ID: %s", probes[probe], response)
+                return probes[probe]
+    return None
+
+
+#Owns the serial port and runs every blocking laser command on its own thread.
+#The GUI queues commands with send() and drains LaserReading objects from the results queue.
+#In DM or DS mode it polls one reading per poll_interval; in DT or DX mode the laser streams and every frame is posted.
+#Baud rate, sample time and delays come from a LaserProfile.
+class LaserReader(threading.Thread):
+    stream_read_timeout: float = 0.1 #Serial read timeout while streaming, keeps the command queue responsive
+    max_sample_time: float = 6.0 #Slowest DT/DX frame the AR1000 gives (poor target); the stall limit never goes lower
+    id_timeout: float = 1.0 #Longest wait for the ID reply when connecting or probing
+    reserved_ports = set() #Ports configured or found for every reader; autodiscovery never probes these
+    discovery_lock = threading.Lock() #One reader probes at a time, so two stations can't claim the same laser
+    reconnect_delay: float = 0.5 #Seconds before the first retry after a failure; doubles with each failure
+    max_reconnect_delay: float = 30.0
+    max_missed_readings: int = 5 #Unanswered DMs in a row before the link counts as lost
+    trace = None #Called with the bytes of every measurement read while a session is recorded
+
+    def __init__(self, port: str, results: queue.Queue, mode: str = "DM", auto_discover: bool = False,
+                 profile: LaserProfile | None = None):
+        threading.Thread.__init__(self, name="LaserReader", daemon=True)
+        self.port = port
+        self.results = results
+        self.mode = mode #DM or DS polls (DS is slower but more precise); DT and DX are continuous tracking modes
+        self.profile = profile if profile is not None else LaserProfile()
+        #Set from the profile, then shortened by tune() once the laser's real reply time is known
+        self.response_timeout = self.profile.response_timeout
+        self.stream_drain = self.profile.stream_drain
+        self.stream_stall_timeout = max(self.profile.stream_stall_timeout, self.max_sample_time)
+        self.auto_discover = auto_discover #Search the other serial ports if port doesn't answer
+        LaserReader.reserved_ports.add(port)
+        self.commands = queue.Queue()
+        self.parser = LaserFrameParser()
+        self.laser_object = serial.Serial() #Gets opened in connect()
+        self.is_connected = False
+        self.polling = False
+        self.streaming = False
+        self.last_frame_time = 0.0
+
+        #Connection supervisor, all on this thread: a lost link is closed and retried with backoff,
+        # and measuring resumes by itself once it's back.
+        self.link_state = "disconnected"
+        self.measuring = False #Polling or streaming was asked for and should survive reconnects
+        self.reconnect_attempts = 0 #Failures since the link was last up
+        self.reconnect_at = None #time.monotonic() of the next automatic connect, None if none is due
+        self.missed_readings = 0
+        self.disconnects = 0
+        self.downtime = 0.0
+        self.down_since = None
+
+
+    #Thread-safe; commands are "connect", "poll", "measure", "reset" and "stop".
+    def send(self, command: str):
+        self.commands.put(command)
+
+
+    def post(self, status: str | None = None, length: float | None = None, error: bool = False,
+             port: str | None = None):
+        self.results.put(LaserReading(time.monotonic(), self.is_connected, status, length, error, port,
+                                      self.link_state, self.disconnects, self.downtime, self.down_since))
+
+
+    def run(self):
+        while True:
+            if self.streaming:
+                #The stream read itself waits up to stream_read_timeout, so don't wait on commands too.
+                timeout = 0
+            elif self.polling:
+                timeout = self.profile.poll_interval
+            else:
+                timeout = None
+            if self.reconnect_at is not None:
+                wait = max(0.0, self.reconnect_at - time.monotonic())
+                timeout = wait if timeout is None else min(timeout, wait)
+
+            try:
+                #A quiet command queue means it's time for the next measurement or stream read.
+                command = self.commands.get(timeout=timeout)
+            except queue.Empty:
+                if self.reconnect_at is not None and time.monotonic() >= self.reconnect_at:
+                    command = "connect"
+                else:
+                    command = "read" if self.streaming else "measure"
+
+            if command == "stop":
+                break
+            elif command == "connect":
+                self.connect()
+            elif command == "poll":
+                self.measuring = True
+                if self.is_connected:
+                    self.start_measuring()
+                else:
+                    self.post("Laser not connected. Measuring starts once it reconnects.")
+            elif command == "measure":
+                self.measure()
+            elif command == "read":
+                self.read_stream()
+            elif command == "reset":
+                self.reset()
+
+        self.close()
+
+
+    def start_measuring(self):
+        if self.mode in ("DM", "DS"):
+            self.polling = True
+            self.measure()
+        else:
+            self.start_stream()
+
+
+    #Establish serial communication, searching the other serial ports if the configured one doesn't answer.
+    #On failure another attempt is scheduled with backoff; on success measuring resumes if it was running.
+    def connect(self):
+        self.reconnect_at = None
+        status = None
+        port = None
+        failure = self.open_laser(self.port)
+        #Only the first attempt of an outage searches; retries just knock on the port that last worked.
+        if failure is not None and self.auto_discover and self.reconnect_attempts == 0:
+            self.post(failure + " Searching other ports...")
+            port = self.discover()
+            if port is not None and self.open_laser(port) is None:
+                self.port = port
+                failure = None
+                status = "Laser found on " + port
+            else:
+                port = None
+
+        if failure is not None:
+            if self.down_since is None:
+                self.down_since = time.monotonic()
+            delay = self.schedule_reconnect()
+            self.post("{0} Retrying in {1:.0f}s.".format(failure, math.ceil(delay)))
+            return
+
+        if self.down_since is not None:
+            self.downtime += time.monotonic() - self.down_since
+            self.down_since = None
+        self.reconnect_attempts = 0
+        self.missed_readings = 0
+        self.link_state = "connected"
+        self.post(status if status is not None else "Laser connected on " + self.port, port=port)
+        if self.measuring:
+            self.start_measuring()
+
+
+    #Jittered exponential backoff, so a flapping adapter isn't hammered and several stations don't retry in step.
+    #Returns the delay chosen.
+    def schedule_reconnect(self):
+        delay = min(self.max_reconnect_delay, self.reconnect_delay * 2 ** self.reconnect_attempts)
+        delay *= random.uniform(0.5, 1.0)
+        self.reconnect_attempts += 1
+        self.reconnect_at = time.monotonic() + delay
+        self.link_state = "reconnecting"
+        return delay
+
+
+    #The link stopped answering: close the port and let the supervisor bring it back.
+    def link_lost(self, reason: str):
+        logging.error("Laser link lost: %s", reason)
+        self.close()
+        self.disconnects += 1
+        self.down_since = time.monotonic()
+        self.reconnect_attempts = 0
+        delay = self.schedule_reconnect()
+        self.post("Laser offline ({0}). Reconnecting in {1:.0f}s.".format(reason, math.ceil(delay)))
+
+
+    #Open port and check the laser answers ID. Returns None once connected, or a status line for the operator.
+    def open_laser(self, port: str):
+        try:
+            #serial_for_url also accepts pyserial URLs such as socket://host:port (see ar1000_sim.py).
+            self.laser_object = serial.serial_for_url(port, baudrate=self.profile.baud_rate, timeout=self.id_timeout,
+                                                      write_timeout=3)
+            started = stage_timer.start()
+            self.laser_object.write(b'ID\r\n') #Send the ID command to check the connection
+            #readline() returns as soon as the reply ends; only a silent port waits out id_timeout.
+            response = self.laser_object.readline()
+            stage_timer.stop("laser ID", started)
+            if (response is None or len(response) == 0):
+                raise serial.SerialTimeoutException("No response from laser.")
+            self.laser_object.reset_input_buffer()
+            self.laser_object.timeout = 3
+
+            logging.info("Laser connected on %s: %s", port, response)
+            self.is_connected = True
+            if self.profile.sample_time is not None:
+                self.set_sample_time(self.profile.sample_time)
+            if self.profile.auto_tune and self.mode in ("DM", "DS"):
+                self.tune()
+            return None
+        except serial.SerialTimeoutException as e:
+            logging.error("Laser read timed out on %s: %s", port, e)
+            failure = "Laser connection on " + port + " timed out."
+        except serial.SerialException as e:
+            logging.error("Serial exception: %s", e)
+            failure = "Laser not found on " + port + " - check connection and configuration."
+        except Exception as e:
+            logging.error(" Unhandled Exception: %s", e)
+            return "Unhandled exception. Restart program."
+        self.close()
+        return failure
+
+
+    #Find the laser on another port. Returns the port, or None if nothing answered.
+    def discover(self):
+        with LaserReader.discovery_lock:
+            logging.warning("No laser on %s, probing the other serial ports...", self.port)
+            started = stage_timer.start()
+            port = discover_laser_port(LaserReader.reserved_ports, self.id_timeout, self.profile.baud_rate)
+            stage_timer.stop("laser discovery", started)
+            if port is not None:
+                LaserReader.reserved_ports.add(port)
+        return port
+
+
+    #Set the laser's sample time (ST). The reply is only logged; a laser without ST support answers E61.
+    def set_sample_time(self, sample_time: int):
+        try:
+            self.laser_object.write(bytes("ST{0}".format(sample_time), "ascii") + b'\r\n')
+            response = self.laser_object.readline().decode('utf-8', 'replace').strip()
+            logging.info("ST%d: %s", sample_time, response)
+        except serial.SerialException as e:
+            logging.error("Error setting sample time: %s", e)
+
+
+    #Time a few measurements and set response_timeout (and the stream drain wait) from the slowest reply,
+    # with headroom for jitter. Runs after every connect, since ST and the target change the reply time.
+    #The tuned value is only measure()'s first wait; a reply isn't missed until the configured one has passed.
+    def tune(self):
+        latencies = []
+        self.laser_object.timeout = self.profile.response_timeout * 3
+        try:
+            for i in range(self.profile.tune_samples):
+                self.laser_object.reset_input_buffer()
+                started = time.perf_counter()
+                self.laser_object.write(bytes(self.mode, "ascii") + b'\r\n')
+                response = self.laser_object.readline()
+                if len(response) > 0:
+                    latencies.append(time.perf_counter() - started)
+        except serial.SerialException as e:
+            logging.error("Laser auto-tune failed: %s", e)
+            return
+        if len(latencies) == 0:
+            logging.warning("Laser auto-tune got no replies; keeping a %.2fs response timeout.", self.response_timeout)
+            return
+
+        slowest = max(latencies)
+        self.response_timeout = min(self.profile.response_timeout, max(0.05, slowest * 2 + 0.02))
+        self.stream_drain = min(self.profile.stream_drain, max(0.02, slowest * 2))
+        logging.info("Laser auto-tune: %s replies in %.0f-%.0fms, response timeout %.0fms", self.mode,
+                     min(latencies) * 1000, slowest * 1000, self.response_timeout * 1000)
+
+
+    def measure(self):
+        if not self.is_connected:
+            #The supervisor restarts polling once it has reconnected.
+            self.polling = False
+            logging.warning("Laser not connected.")
+            self.post("Laser not connected.")
+            return
+
+        logging.debug("Getting laser length (%s)", self.mode)
+        #DM is the fast single measurement, DS the more precise one; the sample time (ST) bounds both.
+        try:
+            self.parser.clear()
+            started = stage_timer.start()
+            self.laser_object.timeout = self.response_timeout
+            #Drop any late reply to the previous command, or it would be read as this one's and every
+            # reading after it would be one poll behind.
+            self.laser_object.reset_input_buffer()
+            self.laser_object.write(bytes(self.mode, "ascii") + b'\r\n') #Send the command to get the length
+            logging.debug("Waiting for laser response...")
+            #Returns as soon as the reply's line ends; response_timeout only matters when the laser is slow or silent.
+            waited = time.perf_counter()
+            response = self.laser_object.readline()
+            if not response.endswith(b'\n'):
+                #Slower than at tune time (e.g. the target changed): keep waiting out the configured timeout,
+                # and start the next first wait from this reply's time.
+                self.laser_object.timeout = max(0.0, self.profile.response_timeout - (time.perf_counter() - waited))
+                response += self.laser_object.readline()
+                if response.endswith(b'\n'):
+                    self.response_timeout = min(self.profile.response_timeout,
+                                                (time.perf_counter() - waited) * 2 + 0.02)
+                    logging.info("Laser reply took %.0fms; first wait now %.0fms",
+                                 (time.perf_counter() - waited) * 1000, self.response_timeout * 1000)
+            stage_timer.stop("laser " + self.mode, started)
+            if self.trace is not None:
+                self.trace(response)
+            logging.debug("Laser response: %s", response)
+            started = stage_timer.start()
+            frames = self.parser.feed(response)
+            stage_timer.stop("laser parse", started)
+            if len(frames) == 0:
+                #readline() timed out before a terminator arrived
+                logging.error("Non-numeric value received from laser.")
+                self.missed_readings += 1
+                if self.missed_readings >= self.max_missed_readings:
+                    self.link_lost("no answer to {0} readings".format(self.missed_readings))
+                    return
+                self.post(parse_laser_error(""), 0.0, True)
+            else:
+                self.missed_readings = 0
+                self.post_frame(frames[-1])
+        except serial.SerialTimeoutException:
+            self.link_lost("write timed out")
+            return
+        except serial.SerialException as e:
+            #The port itself failed, e.g. the USB adapter was unplugged.
+            self.link_lost(str(e))
+            return
+        except Exception as e:
+            logging.error("Unhandled Exception: %s", e)
+            self.post("Unhandled exception. Restart program.", 0.0, True)
+
+
+    #Hand one parsed frame to the GUI.
+    def post_frame(self, frame: tuple):
+        self.post(*frame_reading(frame))
+
+
+    #Put the laser into continuous tracking output (DT or DX).
+    def start_stream(self):
+        if not self.is_connected:
+            logging.warning("Laser not connected.")
+            self.post("Laser not connected.")
+            return
+
+        logging.info("Starting continuous measurement (%s)", self.mode)
+        try:
+            self.parser.clear()
+            self.laser_object.reset_input_buffer()
+            self.laser_object.timeout = self.stream_read_timeout
+            self.laser_object.write(bytes(self.mode, "ascii") + b'\r\n')
+            self.streaming = True
+            self.last_frame_time = time.monotonic()
+        except serial.SerialException as e:
+            self.link_lost(str(e) or "write timed out")
+        except Exception as e:
+            logging.error("Unhandled Exception: %s", e)
+            self.post("Unhandled exception. Restart program.")
+
+
+    #Any character stops tracking output; ESC is the documented one.
+    def stop_stream(self):
+        if not self.streaming:
+            return
+        logging.info("Stopping continuous measurement")
+        self.streaming = False
+        try:
+            self.laser_object.write(b'\x1b')
+            time.sleep(self.stream_drain) #Let the last frames drain before they're discarded
+            self.laser_object.reset_input_buffer()
+            self.laser_object.timeout = 3
+        except Exception as e:
+            logging.error("Error stopping laser stream: %s", e)
+        self.parser.clear()
+
+
+    #Read whatever the stream has produced and post every complete frame.
+    def read_stream(self):
+        try:
+            data = self.laser_object.read(max(1, self.laser_object.in_waiting))
+        except serial.SerialException as e:
+            self.link_lost(str(e))
+            return
+        except Exception as e:
+            logging.error("Laser stream read failed: %s", e)
+            data = b""
+
+        now = time.monotonic()
+        if self.trace is not None and len(data) > 0:
+            self.trace(data)
+        started = stage_timer.start()
+        frames = self.parser.feed(data)
+        stage_timer.stop("laser parse", started)
+        for frame in frames:
+            self.post_frame(frame)
+        if len(frames) > 0:
+            self.last_frame_time = now
+        elif now - self.last_frame_time > self.stream_stall_timeout:
+            self.link_lost("stream stalled")
+
+
+    #Send an off / on signal to the laser, or reconnect straight away (skipping the backoff) if it's not connected.
+    def reset(self):
+        if not self.is_connected:
+            logging.warning("Laser not connected. Attempting to reconnect...")
+            self.close()
+            self.reconnect_attempts = 0
+            self.connect()
+            return
+
+        #Tracking output would be mistaken for the LF/LO replies; resume it afterwards.
+        was_streaming = self.streaming
+        self.stop_stream()
+
+        logging.info("Resetting Laser...")
+        ##Send a LF followed by LO after a short delay
+        try:
+            self.laser_object.timeout = 3
+            logging.info("Writing LF (laser off)")
+            started = stage_timer.start()
+            self.laser_object.write(b'LF\r\n')
+            logging.info("Checking laser response...")
+            rl = self.laser_object.readline().decode('utf-8', 'replace').strip()
+            stage_timer.stop("laser LF", started)
+            logging.info("Laser response: %s", rl)
+            self.post(parse_laser_error(rl))
+            time.sleep(self.profile.reset_delay) #Wait for the laser to reset
+            self.laser_object.flush()
+            logging.info("Writing LO (laser on)")
+            started = stage_timer.start()
+            self.laser_object.write(b'LO\r\n')
+            logging.info("Checking laser response...")
+            rl = self.laser_object.readline().decode('utf-8', 'replace').strip()
+            stage_timer.stop("laser LO", started)
+            logging.info("Laser response: %s", rl)
+            self.post(parse_laser_error(rl))
+        except serial.SerialException as e:
+            self.link_lost(str(e) or "reset timed out")
+            return
+        except Exception as e:
+            logging.error("Unhandled Exception: %s", e)
+            self.post("Unhandled exception. Restart program.")
+
+        if was_streaming:
+            self.start_stream()
+
+
+    def close(self):
+        if self.is_connected:
+            self.stop_stream()
+        self.is_connected = False
+        self.polling = False
+        self.streaming = False
+        try:
+            self.laser_object.close() #Close the serial port if it's open
+        except Exception as e:
+            logging.error("Error closing serial port: %s", e)
+
+
+#Label layout, defined once. Entries are (x, y, caption) for static text or (x, y, n) for variable field ^FNn:
+# 1 WO#, 2 order length, 3 produced length, 4 tolerance, 5 off by.
+#Font A at height 20 is 12 dots per character, so every value starts 11 characters (132 dots) in.
+LABEL_FONT = "^CFA,20"
+LABEL_LAYOUT = [
+    (0, 90, "WO#"), (36, 90, 1), (84, 90, ":"), (132, 90, 2),
+    (0, 110, "Produced:"), (132, 110, 3),
+    (0, 130, "Tolerance:"), (132, 130, 4),
+    (0, 150, "Off by:"), (132, 150, 5),
+]
+#Stored in flash (E:) rather than RAM (R:) so a power-cycled printer still has it.
+LABEL_FORMAT_NAME = "E:WESPA.ZPL"
+
+
+#^PQ asks the printer itself for more than one copy, so a bundle's labels go out as one format.
+def label_quantity_zpl(copies: int):
+    return "^PQ{0}".format(copies) if copies > 1 else ""
+
+
+#ZPL that stores the layout on the printer (^DF). Sent once per printer session.
+def label_format_zpl():
+    zpl = "^XA^DF" + LABEL_FORMAT_NAME + "^FS" + LABEL_FONT
+    for x, y, item in LABEL_LAYOUT:
+        if isinstance(item, str):
+            zpl += "^FO{0},{1}^FD{2}^FS".format(x, y, item)
+        else:
+            zpl += "^FO{0},{1}^FN{2}^FS".format(x, y, item)
+    return zpl + "^XZ"
+
+
+#ZPL for one label that recalls the stored layout (^XF) and only carries the variable fields.
+def label_recall_zpl(fields: tuple, copies: int = 1):
+    zpl = "^XA^XF" + LABEL_FORMAT_NAME + "^FS"
+    for number, value in enumerate(fields, 1):
+        zpl += "^FN{0}^FD{1}^FS".format(number, value)
+    return zpl + label_quantity_zpl(copies) + "^XZ"
+
+
+#ZPL for one self-contained label, for printers that can't store formats.
+def label_inline_zpl(fields: tuple, copies: int = 1):
+    zpl = "^XA" + LABEL_FONT
+    for x, y, item in LABEL_LAYOUT:
+        text = item if isinstance(item, str) else fields[item - 1]
+        zpl += "^FO{0},{1}^FD{2}^FS".format(x, y, text)
+    return zpl + label_quantity_zpl(copies) + "^XZ"
+
+
+#A label waiting in the print queue.
+@dataclass
+class PrintJob:
+    job_id: int
+    name: str #Spooler document name
+    data: bytes #Raw ZPL
+
+
+#Posted by the print spooler to the GUI once a job has been sent or has failed.
+@dataclass
+class PrintResult:
+    job_id: int
+    name: str
+    success: bool
+    message: str
+
+
+#Printer backends hold one open connection for the whole session.
+#open() runs lazily before the first job and again after any failure; write() sends one job.
+class PrinterBackend:
+    partial: bool = False #The last write() failed after part of the job had gone out, so resending could print it twice
+
+    def open(self):
+        pass
+
+    def write(self, job: PrintJob):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+#RAW jobs through the Windows spooler. An empty printer name means the system default printer.
+class Win32PrinterBackend(PrinterBackend):
+    def __init__(self, printer_name: str = ""):
+        self.printer_name = printer_name
+        self.handle = None
+
+
+    def open(self):
+        #https://timgolden.me.uk/python/win32_how_do_i/print.htm
+        if win32print is None:
+            raise RuntimeError("win32print is not available on this system.")
+        name = self.printer_name if self.printer_name != "" else win32print.GetDefaultPrinterW()
+        self.handle = win32print.OpenPrinter(name)
+        logging.info("Opened printer: %s", name)
+
+
+    def write(self, job: PrintJob):
+        #Per win32print documentation, arg 2 must be None to print to a printer.
+        win32print.StartDocPrinter(self.handle, 1, (job.name, None, "RAW"))
+        try:
+            win32print.StartPagePrinter(self.handle)
+            win32print.WritePrinter(self.handle, job.data)
+            win32print.EndPagePrinter(self.handle)
+        finally:
+            win32print.EndDocPrinter(self.handle)
+
+
+    def close(self):
+        if self.handle is not None:
+            logging.info("Closing printer...")
+            win32print.ClosePrinter(self.handle)
+            self.handle = None
+
+
+#Appends every job to a file. Lets the print path run without a printer, e.g. on Linux.
+class FilePrinterBackend(PrinterBackend):
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+
+
+    def open(self):
+        self.file = open(self.path, "ab")
+        logging.info("Printing to file: %s", self.path)
+
+
+    def write(self, job: PrintJob):
+        self.file.write(job.data)
+        self.file.flush()
+
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+#Raw ZPL over TCP (port 9100 on Zebra network printers), skipping the Windows spooler.
+#The socket stays open between labels; a printer that dropped it is reconnected before the next write,
+# and a failed write is reopened and retried by the spooler.
+class TcpPrinterBackend(PrinterBackend):
+    default_port: int = 9100
+    connect_timeout: float = 3.0
+    write_timeout: float = 5.0
+
+    def __init__(self, address: str):
+        host, _, port = address.strip().rpartition(":")
+        if host == "" or not port.isdigit():
+            host, port = address.strip(), self.default_port
+        if host == "":
+            raise ValueError("printerAddress is required for the tcp printer backend")
+        self.address = (host, int(port))
+        self.sock = None
+
+
+    def open(self):
+        self.sock = socket.create_connection(self.address, timeout=self.connect_timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) #Send each label at once, don't wait for more
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.sock.settimeout(self.write_timeout)
+        logging.info("Connected to printer at %s:%d", *self.address)
+
+
+    #True if the printer closed the connection while it sat idle. Anything the printer sent is discarded.
+    def peer_closed(self):
+        try:
+            while select.select([self.sock], [], [], 0)[0]:
+                if self.sock.recv(4096) == b"":
+                    return True
+        except OSError:
+            return True
+        return False
+
+
+    #Reconnects before the first byte goes out. send() rather than sendall(), so a failure knows whether
+    # any of the job had already been sent.
+    def write(self, job: PrintJob):
+        self.partial = False
+        if self.sock is None or self.peer_closed():
+            logging.info("Printer connection closed, reconnecting")
+            self.close()
+            self.open()
+        data = memoryview(job.data)
+        sent = 0
+        try:
+            while sent < len(data):
+                sent += self.sock.send(data[sent:])
+        except OSError:
+            self.partial = sent > 0
+            raise
+
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            finally:
+                self.sock = None
+
+
+#Throws every job away. For running stations with no printer at all.
+class NullPrinterBackend(PrinterBackend):
+    def write(self, job: PrintJob):
+        logging.debug("Discarded %s (%d bytes)", job.name, len(job.data))
+
+
+#Sends queued labels to a backend on its own thread, so the GUI never waits on the spooler.
+#Results go back to the GUI as PrintResult objects.
+#preamble (e.g. the stored label format) is sent ahead of the first job after every (re)open.
+class PrintSpooler(threading.Thread):
+    max_queued_jobs: int = 16
+    attempts_per_job: int = 2 #A failed write reopens the backend and tries once more
+
+    def __init__(self, backend: PrinterBackend, results: queue.Queue, preamble: bytes = b""):
+        threading.Thread.__init__(self, name="PrintSpooler", daemon=True)
+        self.backend = backend
+        self.results = results
+        self.preamble = preamble
+        self.jobs = queue.Queue(maxsize=self.max_queued_jobs)
+        self.is_open = False
+        self.preamble_sent = False
+
+
+    #Thread-safe. Returns False instead of blocking when the queue is full.
+    def submit(self, job: PrintJob):
+        try:
+            self.jobs.put_nowait(job)
+            return True
+        except queue.Full:
+            logging.error("Print queue full, dropping %s", job.name)
+            return False
+
+
+    def stop(self):
+        try:
+            self.jobs.put(None, timeout=1)
+        except queue.Full:
+            logging.error("Print queue full, spooler not stopped cleanly.")
+
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            self.print_job(job)
+
+        self.close_backend()
+
+
+    def print_job(self, job: PrintJob):
+        error = None
+        for attempt in range(self.attempts_per_job):
+            try:
+                started = stage_timer.start()
+                if not self.is_open:
+                    self.backend.open()
+                    self.is_open = True
+                    stage_timer.stop("printer open", started)
+                    started = stage_timer.start()
+                if not self.preamble_sent and len(self.preamble) > 0:
+                    #One document, so the format download and the label go out as a single spooler job.
+                    logging.info("Sending label format to printer")
+                    self.backend.write(replace(job, data=self.preamble + job.data))
+                    self.preamble_sent = True
+                else:
+                    self.backend.write(job)
+                stage_timer.stop("printer write", started)
+                logging.info("Printed %s", job.name)
+                self.results.put(PrintResult(job.job_id, job.name, True, "Printed " + job.name))
+                return
+            except Exception as e:
+                error = e
+                logging.error("Error printing label (attempt %d): %s", attempt + 1, e)
+                self.close_backend()
+                if self.backend.partial:
+                    #Part of the label may already be printing; sending it again could print a duplicate.
+                    logging.error("%s was partly sent, not retrying", job.name)
+                    self.results.put(PrintResult(job.job_id, job.name, False,
+                                                 "Print failed part way, check the printer: " + str(error)))
+                    return
+
+        self.results.put(PrintResult(job.job_id, job.name, False, "Print failed: " + str(error)))
+
+
+    #Closing also forgets the preamble, so it's resent in case the printer was reset.
+    def close_backend(self):
+        self.is_open = False
+        self.preamble_sent = False
+        try:
+            self.backend.close()
+        except Exception as e:
+            logging.error("Error closing printer: %s", e)
+
+
+#Build the backend a station's printerBackend names.
+def make_printer_backend(kind: str, printer_name: str, output_file: str, address: str = ""):
+    if kind == "win32":
+        return Win32PrinterBackend(printer_name)
+    elif kind == "tcp":
+        return TcpPrinterBackend(address)
+    elif kind == "file":
+        return FilePrinterBackend(output_file)
+    elif kind == "null":
+        return NullPrinterBackend()
+    raise ValueError("Unknown printer backend: " + kind)
+
+
+#Background thread that takes rows from a queue and hands them to write() in batches.
+#A batch goes out once it holds batch_size rows or flush_interval seconds have passed.
+class BatchWriter(threading.Thread):
+    batch_size: int = 200 #Rows per write
+    flush_interval: float = 2.0 #Seconds before a partial batch is written anyway
+
+    def __init__(self, name: str):
+        threading.Thread.__init__(self, name=name, daemon=True)
+        self.rows = queue.Queue()
+
+
+    #Thread-safe and non-blocking.
+    def put(self, row):
+        self.rows.put(row)
+
+
+    #Writes whatever is queued, then ends the thread.
+    def stop(self):
+        self.rows.put(None)
+
+
+    def run(self):
+        self.open()
+        running = True
+        while running:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    row = self.rows.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if row is None:
+                    running = False
+                    break
+                batch.append(row)
+
+            if len(batch) > 0:
+                self.write(batch)
+        self.close()
+
+
+    def open(self):
+        pass
+
+
+    def write(self, batch: list):
+        raise NotImplementedError
+
+
+    def close(self):
+        pass
+
+
+#Compact per-reading telemetry, kept out of the free-text log.
+#Rows are queued by the GUI and written to a CSV per day in batches on a background thread.
+class TelemetryWriter(BatchWriter):
+    columns = ["time", "station", "work_order", "order_length", "raw_length", "laser_offset",
+               "adjusted_length", "order_difference", "stable", "tolerance_color"]
+
+    def __init__(self, directory: str):
+        BatchWriter.__init__(self, "TelemetryWriter")
+        self.directory = directory
+
+
+    #Thread-safe and non-blocking. The row follows the order of columns, minus the time.
+    def record(self, *row):
+        self.put((time.time(),) + row)
+
+
+    def write(self, batch: list):
+        #One file per day; rows are split if a batch spans midnight.
+        by_day = {}
+        for row in batch:
+            by_day.setdefault(time.strftime('%Y-%m-%d', time.localtime(row[0])), []).append(row)
+
+        for day, rows in by_day.items():
+            path = os.path.join(self.directory, day + ' wespa39-128 measurements.csv')
+            try:
+                is_new = not os.path.exists(path)
+                with open(path, "a", newline="") as f:
+                    writer = csv.writer(f)
+                    if is_new:
+                        writer.writerow(self.columns)
+                    for row in rows:
+                        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row[0]))
+                        writer.writerow((stamp + ".{0:03d}".format(int(row[0] % 1 * 1000)),) + row[1:])
+            except OSError as e:
+                logging.error("Error writing telemetry: %s", e)
+
+
+#Trace payloads are escaped into a single printable ASCII field; decoding always gives bytes back.
+def encode_trace_payload(payload):
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return payload.decode("latin-1").encode("unicode_escape").decode("ascii")
+
+
+def decode_trace_payload(text: str):
+    return text.encode("ascii").decode("unicode_escape").encode("latin-1")
+
+
+#Records a session for replay with wespa_trace.py: raw laser bytes, scanner keys, hotkeys, print payloads and
+# print button changes. The first line holds the settings the session ran with; each event after it is one
+# "seconds<TAB>kind<TAB>station index<TAB>payload" line, gzip compressed.
+class TraceRecorder(BatchWriter):
+    version: int = 1
+
+    def __init__(self, path: str, header: dict):
+        BatchWriter.__init__(self, "TraceRecorder")
+        self.path = path
+        self.header = header
+        self.started = time.monotonic()
+        self.file = None
+
+
+    #Thread-safe and non-blocking. payload is bytes or text.
+    def record(self, kind: str, station: int, payload=b""):
+        self.put((time.monotonic() - self.started, kind, station, payload))
+
+
+    def open(self):
+        try:
+            self.file = gzip.open(self.path, "wt", encoding="ascii", newline="\n")
+            self.file.write("#wespa-trace {0} {1}\n".format(self.version, json.dumps(self.header)))
+            logging.info("Recording trace to %s", self.path)
+        except OSError as e:
+            logging.error("Error opening trace file: %s", e)
+            self.file = None
+
+
+    def write(self, batch: list):
+        if self.file is None:
+            return
+        try:
+            self.file.write("".join("{0:.4f}\t{1}\t{2}\t{3}\n".format(t, kind, station, encode_trace_payload(payload))
+                                    for t, kind, station, payload in batch))
+        except OSError as e:
+            logging.error("Error writing trace: %s", e)
+
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+#Embedded SQLite journal of printed labels and completed orders, for QA lookups by work order.
+#Times are Unix seconds; the print_history and order_history views show them as local time.
+class ProductionJournal(BatchWriter):
+    batch_size: int = 50
+    flush_interval: float = 1.0
+    print_columns = ["printed_at", "scanned_at", "work_order", "order_length", "adjusted_length", "laser_offset",
+                     "order_difference", "min_tolerance", "max_tolerance", "tolerance_band", "station", "copies"]
+    order_columns = ["scanned_at", "completed_at", "work_order", "barcode", "order_length", "labels_sent",
+                     "adjusted_length", "laser_offset", "order_difference", "min_tolerance", "max_tolerance",
+                     "tolerance_band", "station"]
+    schema = """
+        CREATE TABLE IF NOT EXISTS prints (
+            id INTEGER PRIMARY KEY,
+            printed_at REAL NOT NULL,
+            scanned_at REAL,
+            work_order TEXT,
+            order_length REAL,
+            adjusted_length REAL,
+            laser_offset REAL,
+            order_difference REAL,
+            min_tolerance REAL,
+            max_tolerance REAL,
+            tolerance_band TEXT,
+            station TEXT,
+            copies INTEGER DEFAULT 1
+        );
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY,
+            scanned_at REAL,
+            completed_at REAL NOT NULL,
+            work_order TEXT,
+            barcode TEXT,
+            order_length REAL,
+            labels_sent INTEGER,
+            adjusted_length REAL,
+            laser_offset REAL,
+            order_difference REAL,
+            min_tolerance REAL,
+            max_tolerance REAL,
+            tolerance_band TEXT,
+            station TEXT
+        );
+        CREATE INDEX IF NOT EXISTS prints_work_order ON prints (work_order, printed_at);
+        CREATE INDEX IF NOT EXISTS prints_printed_at ON prints (printed_at);
+        CREATE INDEX IF NOT EXISTS orders_work_order ON orders (work_order, completed_at);
+        CREATE INDEX IF NOT EXISTS orders_completed_at ON orders (completed_at);
+        CREATE VIEW IF NOT EXISTS print_history AS
+            SELECT datetime(printed_at, 'unixepoch', 'localtime') AS printed, * FROM prints;
+        CREATE VIEW IF NOT EXISTS order_history AS
+            SELECT datetime(completed_at, 'unixepoch', 'localtime') AS completed, * FROM orders;
+    """
+
+    def __init__(self, path: str):
+        BatchWriter.__init__(self, "ProductionJournal")
+        self.path = path
+        self.connection = None
+
+
+    #Thread-safe and non-blocking. Values follow print_columns.
+    def record_print(self, *values):
+        self.put(("prints", values))
+
+
+    #Thread-safe and non-blocking. Values follow order_columns.
+    def record_order(self, *values):
+        self.put(("orders", values))
+
+
+    def open(self):
+        try:
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            #WAL with NORMAL sync can only lose the last commits on power loss, never corrupt the file.
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(self.schema)
+            #Journals from before multi-station mode have no station column, and from before multi-copy labels
+            # no copies column; every print in those was one label.
+            for table, column in (("prints", "station TEXT"), ("orders", "station TEXT"),
+                                  ("prints", "copies INTEGER DEFAULT 1")):
+                columns = [row[1] for row in self.connection.execute("PRAGMA table_info({0})".format(table))]
+                if column.split()[0] not in columns:
+                    self.connection.execute("ALTER TABLE {0} ADD COLUMN {1}".format(table, column))
+            logging.info("Production journal opened: %s", self.path)
+        except sqlite3.Error as e:
+            logging.error("Error opening production journal: %s", e)
+            self.connection = None
+
+
+    def write(self, batch: list):
+        if self.connection is None:
+            return
+        tables = {"prints": [], "orders": []}
+        for table, values in batch:
+            tables[table].append(values)
+        try:
+            with self.connection:
+                for table, columns in (("prints", self.print_columns), ("orders", self.order_columns)):
+                    if len(tables[table]) > 0:
+                        self.connection.executemany(
+                            "INSERT INTO {0} ({1}) VALUES ({2})".format(table, ", ".join(columns),
+                                                                         ", ".join("?" * len(columns))),
+                            tables[table])
+        except sqlite3.Error as e:
+            logging.error("Error writing production journal: %s", e)
+
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+#Every print of a work order, newest first, as dicts keyed by column name. Safe to call while the journal is writing.
+def journal_order_history(path: str, work_order: str, limit: int = 100):
+    connection = sqlite3.connect(path)
+    try:
+        connection.row_factory = sqlite3.Row
+        rows = connection.execute("SELECT * FROM print_history WHERE work_order = ? ORDER BY printed_at DESC LIMIT ?",
+                                  (work_order, limit)).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        connection.close()
+
+
+#The most recent print on a station, as a dict like journal_order_history() rows, or None.
+def journal_last_print(path: str, station: str):
+    connection = sqlite3.connect(path)
+    try:
+        connection.row_factory = sqlite3.Row
+        row = connection.execute("SELECT * FROM print_history WHERE station = ? ORDER BY printed_at DESC LIMIT 1",
+                                 (station,)).fetchone()
+        return dict(row) if row is not None else None
+    finally:
+        connection.close()
+
+
+#Label fields (see LABEL_LAYOUT) for a journalled print, so it can be printed again without re-measuring.
+def journal_label_fields(row: dict):
+    return (row["work_order"] or "    ", str(Length.from_inches(row["order_length"])),
+            str(Length.from_inches(row["adjusted_length"])), str(Length.from_inches(row["min_tolerance"])),
+            str(Length.from_inches(row["order_difference"])))
+
+
+#Split a barcode into (symbology, work order, length in inches).
+#Line128 codes start with a 4 digit work order; Line39 codes are just the length, 3 digits max before the point.
+#The length is None if it isn't a number, and the symbology is "" for an empty barcode.
+def split_barcode(text: str):
+    if len(text) > 4 and text[0:4].isdigit():
+        symbology, work_order, length_text = "Line128", text[0:4], text[4:]
+    elif len(text) > 0:
+        symbology, work_order, length_text = "Line39", "", text
+    else:
+        return "", "", None
+
+    try:
+        length = round(float(length_text), 2)
+    except ValueError:
+        length = None
+    return symbology, work_order, length
+
+
+#Why a barcode can't be used, as shown to the operator, or "" if it's valid. Keyed and socket scans both go through it.
+def barcode_error(text: str):
+    symbology, work_order, length = split_barcode(text)
+    if length is None:
+        return "Invalid barcode: " + text
+    elif symbology == "Line39" and len(text.split(".")[0]) > 3:
+        return "Invalid barcode: " + text + " (Line39 length over 3 digits)"
+    elif length <= 0:
+        return "Invalid barcode: " + text + " (zero length)"
+    return ""
+
+
+#A completed barcode, from a scanner burst or typed by hand.
+@dataclass
+class BarcodeScan:
+    text: str
+    symbology: str #"Line128" or "Line39"
+    source: str #"scanner" or "manual"
+    error: str = "" #Why the barcode was rejected; empty if it's valid
+
+
+#A barcode scanned ahead in queue mode, waiting for its turn at the table.
+@dataclass
+class QueuedOrder:
+    barcode: str
+    work_order: str
+    length: Length | None #None if the barcode has no readable length
+
+    #e.g. "1234 - 10 FT 6.0 IN" for the queue list
+    def __str__(self):
+        length = str(self.length) if self.length is not None else "?"
+        return self.work_order + " - " + length if self.work_order != "" else length
+
+
+#Turns key events into barcodes. The scanner types a whole code within a few milliseconds per key,
+# while people are much slower, so key timing tells a scanner burst from manual input.
+#Keys are grouped into runs separated by gaps longer than burst_gap_ms. When Return ends a fast run of at least
+# min_burst_length keys, only that run is the barcode and any slow keys typed before it are dropped.
+#Otherwise everything typed since the last Return is taken as a manual entry.
+#Valid scans are appended to scans, so back-to-back codes stay separate until the GUI gets to them.
+class BarcodeDecoder:
+    def __init__(self, burst_gap_ms: int = 50, min_burst_length: int = 3):
+        self.burst_gap_ms = burst_gap_ms
+        self.min_burst_length = min_burst_length
+        self.chars = []
+        self.run_start = 0 #Index in chars where the current fast run began
+        self.last_time = 0 #Tk event time (ms) of the last key
+        self.scans = deque()
+
+
+    #Tk event times are a 32 bit millisecond counter, so allow for it wrapping.
+    def gap(self, event_time: int):
+        return (event_time - self.last_time) & 0xFFFFFFFF
+
+
+    def key(self, char: str, event_time: int):
+        if len(self.chars) > 0 and self.gap(event_time) > self.burst_gap_ms:
+            self.run_start = len(self.chars)
+        self.chars.append(char)
+        self.last_time = event_time
+
+
+    #Finish the code on Return. Returns the BarcodeScan (valid or not), or None if nothing was typed.
+    def enter(self, event_time: int):
+        if len(self.chars) == 0:
+            return None
+
+        burst = self.chars[self.run_start:]
+        if len(burst) >= self.min_burst_length and self.gap(event_time) <= self.burst_gap_ms:
+            if self.run_start > 0:
+                logging.warning("Dropping manual input %s typed before a scan.", "".join(self.chars[:self.run_start]))
+            text, source = "".join(burst), "scanner"
+        else:
+            text, source = "".join(self.chars), "manual"
+        self.clear()
+
+        symbology, work_order, length = split_barcode(text)
+        scan = BarcodeScan(text, symbology, source, barcode_error(text))
+
+        if scan.error == "":
+            logging.info("Received %s %s input: %s", source, symbology, text)
+            self.scans.append(scan)
+        else:
+            logging.error(scan.error)
+        return scan
+
+
+    def clear(self):
+        self.chars.clear()
+        self.run_start = 0
+
+
+#One row of the ERP order export.
+@dataclass
+class OrderInfo:
+    work_order: str
+    customer: str
+    part: str
+    length: float | None #Expected length in inches, None if the export doesn't have one
+
+
+#Work order lookup from an ERP export, keyed by the 4 digit work order of a Line128 barcode.
+#A CSV export is loaded whole into a dict. A SQLite export (table "orders") is queried one work order at a time,
+# on a connection opened for that query only: an export swapped in by the ERP is read straight away, and no
+# handle is left open to stop the ERP replacing the file on Windows.
+#Either way the columns are work_order, customer, part and length (inches), and recent lookups sit in an LRU cache.
+#The watcher thread reloads when the file's modification time changes and swaps the new index in,
+# so lookups on the GUI thread never wait for a reload.
+class OrderIndex(threading.Thread):
+    check_interval: float = 5.0 #Seconds between modification time checks
+    cache_size: int = 256 #Most recently used work orders kept in the LRU cache
+
+    def __init__(self, path: str):
+        threading.Thread.__init__(self, name="OrderIndex", daemon=True)
+        self.path = path
+        self.is_sqlite = os.path.splitext(path)[1].lower() in (".db", ".sqlite", ".sqlite3")
+        self.index = {} #work order -> OrderInfo, CSV only; replaced whole on reload
+        self.cache = OrderedDict() #work order -> OrderInfo or None, newest last
+        self.lock = threading.Lock()
+        self.generation = 0 #Bumped by every reload; a lookup that spans one doesn't cache its answer
+        self.modified = None
+        self.stopping = threading.Event()
+
+
+    def stop(self):
+        self.stopping.set()
+
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                modified = os.path.getmtime(self.path)
+            except OSError:
+                modified = None
+            if modified != self.modified:
+                self.modified = modified
+                self.reload()
+            self.stopping.wait(self.check_interval)
+
+
+    def reload(self):
+        index = {}
+        if not self.is_sqlite and self.modified is not None:
+            try:
+                with open(self.path, newline="") as f:
+                    for row in csv.DictReader(f):
+                        info = self.make_info(row)
+                        if info is not None:
+                            index[info.work_order] = info
+            except (OSError, csv.Error) as e:
+                logging.error("Error loading order file %s: %s", self.path, e)
+                return
+            logging.info("Loaded %d orders from %s", len(index), self.path)
+
+        with self.lock:
+            self.index = index
+            self.cache.clear()
+            self.generation += 1
+
+
+    def make_info(self, row):
+        work_order = str(row.get("work_order") or "").strip()
+        if work_order == "":
+            return None
+        try:
+            length = float(row["length"]) if row.get("length") not in (None, "") else None
+        except ValueError:
+            length = None
+        return OrderInfo(work_order, str(row.get("customer") or "").strip(), str(row.get("part") or "").strip(), length)
+
+
+    def lookup(self, work_order: str):
+        with self.lock:
+            if work_order in self.cache:
+                self.cache.move_to_end(work_order)
+                return self.cache[work_order]
+            index = self.index
+            generation = self.generation
+
+        if self.is_sqlite:
+            info = self.query(work_order)
+        else:
+            info = index.get(work_order)
+
+        with self.lock:
+            #The export was reloaded while this looked it up; the answer may be from the old one.
+            if generation != self.generation:
+                return info
+            self.cache[work_order] = info
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return info
+
+
+    #Only runs on a cache miss, so opening the export each time costs well under a millisecond per new work order.
+    def query(self, work_order: str):
+        connection = None
+        try:
+            #Read only, so a locked or missing export never gets created or modified here. pathname2url() escapes
+            # #, ? and % and turns a UNC share into file:////server/share/...
+            connection = sqlite3.connect("file:" + urllib.request.pathname2url(os.path.abspath(self.path)) + "?mode=ro",
+                                         uri=True, timeout=0.1)
+            connection.row_factory = sqlite3.Row
+            row = connection.execute("SELECT * FROM orders WHERE work_order = ?", (work_order,)).fetchone()
+            return self.make_info(dict(row)) if row is not None else None
+        except sqlite3.Error as e:
+            logging.error("Error looking up order %s: %s", work_order, e)
+            return None
+        finally:
+            if connection is not None:
+                connection.close()
+
+
+#Settings for one laser and printer pair. Multi-station setups list a [station:N] section per table;
+# anything a station leaves out falls back to the single-station sections, then to these defaults.
+@dataclass
+class StationConfig:
+    name: str = "Station 1"
+    section: str = "ports" #Where laserComPort lives in the .ini, for remembering a discovered port
+    laser_port: str = "COM3"
+    auto_discover: bool = True #Probe the other serial ports if laser_port doesn't answer
+    laser_mode: str = "DM" #DM/DS poll, DT/DX stream continuously
+    baud_rate: int = 9600
+    sample_time: str = "" #ST value sent after connecting; blank leaves the laser's own
+    response_timeout: float = 1.0
+    poll_interval: float = 0.5
+    reset_delay: float = 1.0
+    auto_tune: bool = True
+    stream_stall_timeout: float = 8.0
+    laser_offset: float = 0.0
+    min_tolerance: float = 0.1
+    max_tolerance: float = 6.0
+    printer_backend: str = "win32" #win32/tcp/file/null
+    printer_name: str = "" #Blank for the system default printer
+    printer_address: str = "" #host[:port] for the tcp backend, port 9100 if left out
+    printer_output_file: str = "labels.zpl" #Used by the file backend, relative to the exe
+    stored_label_format: bool = True
+    order_queue: bool = False #Scans queue up behind the current order, which advances after each printed label
+    queue_auto_select: bool = False #Switch to the queued order a stable reading matches
+
+
+#(attribute, [station:N] option, single-station section, single-station option, getter)
+STATION_OPTIONS = [
+    ("laser_port", "laserComPort", "ports", "laserComPort", ConfigParser.get),
+    ("auto_discover", "autoDiscover", "ports", "autoDiscover", ConfigParser.getboolean),
+    ("laser_mode", "measurementMode", "laser", "measurementMode", ConfigParser.get),
+    ("baud_rate", "baudRate", "laser", "baudRate", ConfigParser.getint),
+    ("sample_time", "sampleTime", "laser", "sampleTime", ConfigParser.get),
+    ("response_timeout", "responseTimeout", "laser", "responseTimeout", ConfigParser.getfloat),
+    ("poll_interval", "pollInterval", "laser", "pollInterval", ConfigParser.getfloat),
+    ("reset_delay", "resetDelay", "laser", "resetDelay", ConfigParser.getfloat),
+    ("auto_tune", "autoTune", "laser", "autoTune", ConfigParser.getboolean),
+    ("stream_stall_timeout", "streamStallTimeout", "laser", "streamStallTimeout", ConfigParser.getfloat),
+    ("laser_offset", "laserOffset", "offsets", "laserOffset", ConfigParser.getfloat),
+    ("min_tolerance", "minTolerance", "offsets", "minTolerance", ConfigParser.getfloat),
+    ("max_tolerance", "maxTolerance", "offsets", "maxTolerance", ConfigParser.getfloat),
+    ("printer_backend", "printerBackend", "printer", "backend", ConfigParser.get),
+    ("printer_name", "printerName", "printer", "printerName", ConfigParser.get),
+    ("printer_address", "printerAddress", "printer", "printerAddress", ConfigParser.get),
+    ("printer_output_file", "printerOutputFile", "printer", "outputFile", ConfigParser.get),
+    ("stored_label_format", "storedFormat", "printer", "storedFormat", ConfigParser.getboolean),
+    ("order_queue", "orderQueue", "scanner", "orderQueue", ConfigParser.getboolean),
+    ("queue_auto_select", "queueAutoSelect", "scanner", "queueAutoSelect", ConfigParser.getboolean),
+]
+
+
+#One StationConfig per [station:N] section, in file order, or a single station from the legacy sections if there are none.
+def read_station_configs(c: ConfigParser):
+    sections = [section for section in c.sections() if section.lower().startswith("station:")]
+    stations = []
+    for section in sections or [None]:
+        station = StationConfig()
+        if section is not None:
+            station.name = c.get(section, 'name', fallback="Station " + section.split(":", 1)[1].strip()).strip()
+            station.section = section
+        for attribute, option, legacy_section, legacy_option, getter in STATION_OPTIONS:
+            if section is not None and c.has_option(section, option):
+                setattr(station, attribute, getter(c, section, option))
+            elif c.has_option(legacy_section, legacy_option):
+                setattr(station, attribute, getter(c, legacy_section, legacy_option))
+
+        station.laser_port = station.laser_port.strip()
+        station.printer_backend = station.printer_backend.strip().lower()
+        station.printer_name = station.printer_name.strip()
+        station.printer_address = station.printer_address.strip()
+        station.printer_output_file = station.printer_output_file.strip()
+        station.laser_mode = station.laser_mode.strip().upper()
+        station.sample_time = station.sample_time.strip()
+        if station.sample_time != "" and not station.sample_time.isdigit():
+            logging.error("sampleTime %s for %s isn't a whole number, leaving the laser's own.",
+                          station.sample_time, station.name)
+            station.sample_time = ""
+        if station.laser_mode not in ("DM", "DS", "DT", "DX"):
+            logging.error("Unknown measurementMode %s for %s, using DM.", station.laser_mode, station.name)
+            station.laser_mode = "DM"
+        stations.append(station)
+    return stations
+
+
+#When this process was launched. A onefile build spends its first seconds unpacking itself into a _MEI temp folder
+# before Python starts, so that folder's creation time is the real launch; anything else uses fallback.
+def launch_time(fallback: float):
+    bundle = getattr(sys, '_MEIPASS', None)
+    if getattr(sys, 'frozen', False) and bundle is not None and os.path.basename(bundle).startswith("_MEI"):
+        try:
+            return min(os.path.getctime(bundle), fallback)
+        except OSError:
+            pass
+    return fallback
+
+
+#Set one option in an .ini file in place. Unlike ConfigParser.write(), comments and layout are kept.
+#The section is appended if it's missing, and the option added at the end of its section.
+def update_ini_option(path: str, section: str, option: str, value: str):
+    with open(path, "r") as f:
+        lines = f.read().split("\n")
+
+    header = re.compile(r"^\s*\[(.*)\]\s*$")
+    key = re.compile(r"^\s*" + re.escape(option) + r"\s*[=:]", re.IGNORECASE)
+    current = None
+    last_in_section = None #Index of the last non-blank line of the section
+    for i, line in enumerate(lines):
+        match = header.match(line)
+        if match is not None:
+            current = match.group(1).strip()
+            if current == section:
+                last_in_section = i
+        elif current == section:
+            if key.match(line):
+                lines[i] = "{0} = {1}".format(option, value)
+                break
+            if line.strip() != "":
+                last_in_section = i
+    else:
+        if last_in_section is None:
+            lines.append("[{0}]".format(section))
+            last_in_section = len(lines) - 1
+        lines.insert(last_in_section + 1, "{0} = {1}".format(option, value))
+
+    #Written beside the original and swapped in, so a crash can't leave half an .ini.
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        f.write("\n".join(lines))
+    os.replace(temp_path, path)
+
+
+#One table's measurement logic: its laser worker, print spooler, current order and tolerance state.
+#Shared services (journal, telemetry, order lookups) belong to the MeasurementEngine it was built by.
+#Nothing here touches a display; views register a listener and redraw from the public state after each change.
+class StationEngine:
+    engine: "MeasurementEngine"
+    config: StationConfig
+    index: int #Position in MeasurementEngine.stations; F1 selects index 0
+    listener = None #Called with the station after every state change
+
+    current_barcode: str = "" #Last barcode scanned - delimited by newlines with the scanner
+    order_str: str = "" #First 4 digits of a line128 barcode
+    order_length: Length = Length() #line39 code, or the remaining digits of a line128
+    order_length_str: str = "0.0 IN" #order_length formatted once per barcode
+    order_info_str: str = "" #Customer/part/expected length of the scanned work order
+    order_info_warning: bool = False #True if the order is unknown or disagrees with the barcode
+    order_queue: list #QueuedOrder scanned ahead of the current order, oldest first (queue mode only)
+    laser_length: Length = Length() #Filtered measurement from laser scanner
+    order_difference: Length = Length() #Laser Length + Laser Offset - Order Length
+    laser_offset: Length = Length() #From the station config; adjusts laser length
+    adjusted_length: Length = Length() #Laser Length + Laser Offset
+    min_tolerance: Length = Length(10) #From the station config
+    max_tolerance: Length = Length(600) #From the station config
+    tolerance_indicator: str = "Outside Tolerance"
+    tolerance_color: str = "red" #red/yellow/green
+
+    pending_prints: dict #job_id -> measurement_record() of labels still in the spooler
+    order_scanned_at: float = 0.0 #time.time() the current barcode was scanned
+    order_labels_sent: int = 0 #Labels queued for the current barcode, counting every copy
+
+    print_allowed: bool = False
+    label_copies: int = 1 #Copies the next print sends in one job (^PQ); back to 1 after each print
+    last_label: tuple | None = None #Fields of the last label printed here, for reprints
+    laser_status: str = ""
+    print_status: str = ""
+    print_failed: bool = False #True if the last print_status is an error
+    barcode_scan_time: float = 0.0 #stage_timer.start() of the last completed scan
+
+    print_spooler: PrintSpooler #Worker thread that owns this station's printer
+    print_results: queue.Queue #PrintResult objects posted by print_spooler
+    print_job_count: int = 0
+
+    laser_reader: LaserReader #Worker thread that owns this station's serial port
+    laser_readings: queue.Queue #LaserReading objects posted by laser_reader
+    laser_reading_time: float = 0.0 #time.monotonic() of the last length reading
+    laser_samples: deque #Ring buffer of (timestamp, inches) samples; the newest one drives the display
+    sample_buffer_size: int = 256
+    measurement_filter: MeasurementFilter #Smooths laser_samples; laser_length is its output
+    laser_is_stable: bool = False #True once the filtered reading has settled
+    laser_is_connected: bool = False #True if the laser is connected, false if not.
+    link_state: str = "disconnected" #From the laser worker's supervisor: connected/reconnecting/disconnected
+    disconnects: int = 0
+    downtime: float = 0.0 #Seconds down in finished outages
+    down_since: float | None = None #time.monotonic() the current outage began
+
+    def __init__(self, engine: "MeasurementEngine", config: StationConfig, index: int):
+        self.engine = engine
+        self.config = config
+        self.index = index
+        self.laser_offset = Length.from_inches(config.laser_offset)
+        self.min_tolerance = Length.from_inches(config.min_tolerance)
+        self.max_tolerance = Length.from_inches(config.max_tolerance)
+        self.pending_prints = {}
+        self.order_queue = []
+
+        self.laser_samples = deque(maxlen=self.sample_buffer_size)
+        try:
+            self.measurement_filter = MeasurementFilter(**engine.filter_settings)
+        except ValueError as e:
+            logging.error("%s, using median.", e)
+            self.measurement_filter = MeasurementFilter()
+        self.laser_readings = queue.Queue()
+        profile = LaserProfile(config.baud_rate, int(config.sample_time) if config.sample_time != "" else None,
+                               config.response_timeout, config.poll_interval, config.reset_delay,
+                               stream_stall_timeout=config.stream_stall_timeout, auto_tune=config.auto_tune)
+        self.laser_reader = LaserReader(config.laser_port, self.laser_readings, config.laser_mode,
+                                        config.auto_discover, profile)
+        if engine.trace is not None:
+            self.laser_reader.trace = lambda data: engine.record("serial", index, data)
+        self.laser_reader.start()
+
+        self.print_results = queue.Queue()
+        try:
+            backend = make_printer_backend(config.printer_backend, config.printer_name,
+                                           os.path.join(engine.base_dir, config.printer_output_file),
+                                           config.printer_address)
+        except ValueError as e:
+            logging.error("%s, using win32.", e)
+            backend = Win32PrinterBackend(config.printer_name)
+        preamble = bytes(label_format_zpl(), "utf-8") if config.stored_label_format else b""
+        self.print_spooler = PrintSpooler(backend, self.print_results, preamble)
+        self.print_spooler.start()
+
+
+    def notify(self):
+        if self.listener is not None:
+            self.listener(self)
+
+
+    #Open the port in the background and start measuring once it's up. The worker runs its commands in order.
+    def start(self, poll: bool = True):
+        self.laser_status = "Connecting to laser on " + self.config.laser_port + "..."
+        self.laser_reader.send("connect")
+        if poll:
+            self.get_laser_length()
+
+
+    #Start (or restart with g) the measurement loop on the laser worker.
+    #The worker checks the connection itself and reports "Laser not connected." if it's down.
+    def get_laser_length(self):
+        self.laser_reader.send("poll")
+
+
+    #Send an off / on signal to the laser, or try to reconnect if it's not connected.
+    def reset_laser(self):
+        self.laser_reader.send("reset")
+
+
+    def label_zpl(self, fields: tuple, copies: int = 1):
+        if self.config.stored_label_format:
+            return label_recall_zpl(fields, copies)
+        return label_inline_zpl(fields, copies)
+
+
+    #Queue one spooler job. record is journalled once it prints; reprints pass None so they aren't counted twice.
+    def submit_labels(self, name: str, raw_labels: str, record: dict | None):
+        self.print_job_count += 1
+        job = PrintJob(self.print_job_count, name, bytes(raw_labels, "utf-8"))
+        queued = self.print_spooler.submit(job)
+        if queued:
+            self.print_status = "Printing " + job.name + "..."
+            self.pending_prints[job.job_id] = record
+        else:
+            self.print_status = "Printer busy - label not queued."
+        self.print_failed = False
+        return queued
+
+
+    #Build the ZPL label and hand it to the print spooler; the result comes back through process_print_results().
+    #Returns True if the label was queued.
+    def print_label(self):
+        if not self.print_allowed:
+            return False
+        started = stage_timer.start()
+        logging.info("Printing Label on %s...", self.config.name)
+        #Formatted order length
+        ol_string = self.order_length_str
+        fields = (self.order_str, ol_string, str(self.adjusted_length), str(self.min_tolerance),
+                  str(self.order_difference))
+        raw_label = self.label_zpl(fields, self.label_copies)
+
+        #Journalled once the spooler reports success; see process_print_results().
+        record = self.measurement_record()
+        record["label_fields"] = fields
+        record["copies"] = self.label_copies
+        name = "Label" + ol_string + (" x{0}".format(self.label_copies) if self.label_copies > 1 else "")
+        queued = self.submit_labels(name, raw_label, record)
+        if queued:
+            self.engine.record("print", self.index, raw_label)
+            self.order_labels_sent += self.label_copies
+            self.label_copies = 1
+        stage_timer.stop("send_print_label", started)
+        self.notify()
+        return queued
+
+
+    #+/- on the print button: copies of the next label, sent as one job.
+    def set_label_copies(self, copies: int):
+        self.label_copies = min(max(copies, 1), 99)
+        self.engine.record("copies", self.index, str(self.label_copies))
+        self.notify()
+
+
+    #Print the last label again, e.g. after a jam. Falls back to the journal after a restart.
+    def reprint_last(self, copies: int = 1):
+        self.engine.record("reprint", self.index, str(copies))
+        fields = self.last_label
+        if fields is None and self.engine.journal is not None:
+            try:
+                row = journal_last_print(self.engine.journal.path, self.config.name)
+                fields = journal_label_fields(row) if row is not None else None
+            except sqlite3.Error as e:
+                logging.error("Error reading production journal: %s", e)
+        if fields is None:
+            self.print_status = "Nothing to reprint."
+            self.print_failed = True
+            self.notify()
+            return False
+        logging.info("Reprinting last label on %s", self.config.name)
+        queued = self.submit_labels("Reprint" + fields[1], self.label_zpl(fields, copies), None)
+        self.notify()
+        return queued
+
+
+    #The latest journalled label of each work order, all in one ZPL stream and one spooler job.
+    def reprint_orders(self, work_orders: list, copies: int = 1):
+        if self.engine.journal is None:
+            self.print_status = "Reprints by work order need the journal."
+            self.print_failed = True
+            self.notify()
+            return False
+        raw_labels = ""
+        missing = []
+        for work_order in work_orders:
+            try:
+                rows = journal_order_history(self.engine.journal.path, work_order, 1)
+            except sqlite3.Error as e:
+                logging.error("Error reading production journal: %s", e)
+                rows = []
+            if len(rows) > 0:
+                raw_labels += self.label_zpl(journal_label_fields(rows[0]), copies)
+            else:
+                missing.append(work_order)
+        if raw_labels == "":
+            self.print_status = "No labels found for " + ", ".join(missing) + "."
+            self.print_failed = True
+            self.notify()
+            return False
+        logging.info("Reprinting %s on %s", ", ".join(work_orders), self.config.name)
+        queued = self.submit_labels("Reprint {0} order{1}".format(len(work_orders) - len(missing),
+                                                                  "" if len(work_orders) - len(missing) == 1 else "s"),
+                                    raw_labels, None)
+        if queued and len(missing) > 0:
+            self.print_status += " Not found: " + ", ".join(missing)
+        self.notify()
+        return queued
+
+
+    #Drain results posted by the print spooler.
+    def process_print_results(self):
+        updated = False
+        advanced = False
+        while True:
+            try:
+                result = self.print_results.get_nowait()
+            except queue.Empty:
+                break
+            self.print_status = result.message
+            self.print_failed = not result.success
+            record = self.pending_prints.pop(result.job_id, None)
+            #Reprints have no record: nothing new to journal or advance past.
+            if result.success and record is not None:
+                stage_timer.stop("scan to label printed", self.barcode_scan_time)
+                self.last_label = record["label_fields"]
+                if self.engine.journal is not None:
+                    self.engine.journal.record_print(time.time(), record["scanned_at"], record["work_order"],
+                                                     record["order_length"], record["adjusted_length"],
+                                                     record["laser_offset"], record["order_difference"],
+                                                     record["min_tolerance"], record["max_tolerance"],
+                                                     record["tolerance_band"], self.config.name, record["copies"])
+                #Only if the label was for the order still showing; the operator may have moved on already.
+                if (self.config.order_queue and record["barcode"] == self.current_barcode
+                        and record["scanned_at"] == self.order_scanned_at):
+                    self.next_order()
+                    advanced = True
+            updated = True
+
+        if advanced:
+            self.refresh()
+        elif updated:
+            self.notify()
+
+
+    #Fold one reading from the laser worker into the sample buffer and filter. Returns True for a length sample.
+    #process_laser_readings() feeds this from the worker; benchmarks and replays can call it directly.
+    def apply_reading(self, reading: LaserReading):
+        if reading.connected and not self.laser_is_connected:
+            self.engine.startup_stage(self.config.name + " laser connected")
+        self.laser_is_connected = reading.connected
+        self.link_state = reading.link_state
+        self.disconnects = reading.disconnects
+        self.downtime = reading.downtime
+        self.down_since = reading.down_since
+        if reading.status is not None:
+            self.laser_status = reading.status
+        if reading.port is not None and reading.port != self.config.laser_port:
+            if self.engine.remember_port(self, reading.port):
+                self.laser_status += " (saved to the .ini)"
+        if reading.length is None:
+            return False
+        self.laser_samples.append((reading.timestamp, reading.length))
+        if reading.error:
+            #Start settling again from the next good sample.
+            self.measurement_filter.clear()
+        else:
+            self.measurement_filter.add(reading.length)
+        return True
+
+
+    #Drain readings posted by the laser worker, then refresh once with the newest state.
+    def process_laser_readings(self):
+        updated = False
+        new_sample = False
+        while True:
+            try:
+                reading = self.laser_readings.get_nowait()
+            except queue.Empty:
+                break
+            new_sample = self.apply_reading(reading) or new_sample
+            updated = True
+
+        if updated:
+            if new_sample:
+                self.filter_samples()
+            self.refresh()
+
+
+    #Streaming can post several samples per drain; the filter is evaluated once on the newest window.
+    def filter_samples(self):
+        self.laser_reading_time = self.laser_samples[-1][0]
+        if stage_timer.enabled:
+            #How long the newest sample waited between the worker and the GUI
+            stage_timer.record("laser sample age", time.monotonic() - self.laser_reading_time)
+        started = stage_timer.start()
+        smoothed, self.laser_is_stable = self.measurement_filter.evaluate()
+        self.laser_length = Length.from_inches(smoothed) if smoothed is not None else Length()
+        self.adjusted_length = self.laser_length + self.laser_offset
+        stage_timer.stop("filter", started)
+
+
+    #Snapshot of the current order and measurement for the production journal, lengths in inches.
+    def measurement_record(self):
+        return {"scanned_at": self.order_scanned_at, "work_order": self.order_str.strip(),
+                "barcode": self.current_barcode, "order_length": self.order_length.inches,
+                "adjusted_length": self.adjusted_length.inches, "laser_offset": self.laser_offset.inches,
+                "order_difference": self.order_difference.inches, "min_tolerance": self.min_tolerance.inches,
+                "max_tolerance": self.max_tolerance.inches, "tolerance_band": self.tolerance_color}
+
+
+    #Journal the current order if any labels were sent for it. Runs before the barcode is replaced or cleared.
+    def complete_order(self):
+        if self.engine.journal is not None and self.current_barcode != "" and self.order_labels_sent > 0:
+            record = self.measurement_record()
+            self.engine.journal.record_order(record["scanned_at"], time.time(), record["work_order"],
+                                             record["barcode"], record["order_length"], self.order_labels_sent,
+                                             record["adjusted_length"], record["laser_offset"],
+                                             record["order_difference"], record["min_tolerance"],
+                                             record["max_tolerance"], record["tolerance_band"], self.config.name)
+        self.order_labels_sent = 0
+        self.order_scanned_at = time.time()
+
+
+    #A completed scan routed to this station by the engine. In queue mode it waits behind the current order.
+    def scan_barcode(self, text: str):
+        if self.config.order_queue and self.current_barcode != "":
+            symbology, work_order, length = split_barcode(text)
+            self.order_queue.append(QueuedOrder(text, work_order,
+                                                Length.from_inches(length) if length is not None else None))
+            logging.info("Queued %s on %s (%d waiting)", text, self.config.name, len(self.order_queue))
+        else:
+            self.set_barcode(text)
+
+
+    def set_barcode(self, text: str):
+        self.complete_order()
+        self.current_barcode = text
+        self.parse_barcode()
+
+
+    #Make the oldest queued order current, or clear the barcode if none are waiting.
+    def next_order(self):
+        if len(self.order_queue) > 0:
+            self.set_barcode(self.order_queue.pop(0).barcode)
+        else:
+            self.set_barcode("")
+
+
+    #The operator picked a queued order.
+    def select_queued(self, position: int):
+        self.engine.record("select", self.index, str(position))
+        self.activate_queued(position)
+
+
+    #Swap a queued order with the current one, which goes back into the queue in its place
+    # unless it was finished (it has a label) or empty.
+    def activate_queued(self, position: int):
+        if position < 0 or position >= len(self.order_queue):
+            return
+        selected = self.order_queue[position]
+        if self.current_barcode != "" and self.order_labels_sent == 0:
+            symbology, work_order, length = split_barcode(self.current_barcode)
+            self.order_queue[position] = QueuedOrder(self.current_barcode, work_order,
+                                                     Length.from_inches(length) if length is not None else None)
+        else:
+            del self.order_queue[position]
+        logging.info("Selected queued order %s on %s", selected.barcode, self.config.name)
+        self.set_barcode(selected.barcode)
+
+
+    #First queued order the adjusted length is within minimum tolerance of, or -1.
+    def match_queued(self):
+        for position, order in enumerate(self.order_queue):
+            if order.length is not None and abs(self.adjusted_length - order.length) <= self.min_tolerance:
+                return position
+        return -1
+
+
+    #X drops the current order; in queue mode the next one takes its place.
+    def clear_barcode(self):
+        logging.info("Clearing Barcodes on %s...", self.config.name)
+        self.engine.record("clear", self.index)
+        if self.config.order_queue:
+            self.next_order()
+        else:
+            self.set_barcode("")
+        self.refresh()
+
+
+    def clear_queue(self):
+        logging.info("Clearing %d queued orders on %s", len(self.order_queue), self.config.name)
+        self.engine.record("clear_queue", self.index)
+        self.order_queue.clear()
+        self.notify()
+
+
+    #Only runs when the barcode changes; refresh() reuses the parsed order on every laser tick.
+    def parse_barcode(self):
+        logging.info("Parsing barcode: %s", self.current_barcode)
+
+        if (not self.engine.enable_test_mode):
+            self.order_str = "    "
+            self.order_length = Length()
+        
+        #Until Line128 is used, Work Order won't be in the barcode - be sure to code for it not being there.
+        symbology, work_order, length = split_barcode(self.current_barcode)
+        if symbology == "Line128":
+            self.order_str = work_order
+        if symbology == "":
+            #currentBarcode is empty or wrong format.
+            self.order_str = "    "
+            self.order_length = Length()
+            logging.error("Error: Barcode %s is empty or in the wrong format.", self.current_barcode)
+        elif length is None:
+            logging.error("ValueError: Could not convert %s to float.", self.current_barcode)
+        else:
+            self.order_length = Length.from_inches(length)
+
+        self.order_length_str = str(self.order_length)
+        self.lookup_order()
+
+
+    #Show customer, part and expected length for the scanned work order, if an order file is configured.
+    def lookup_order(self):
+        self.order_info_str = ""
+        self.order_info_warning = False
+        if self.engine.order_index is None or self.order_str.strip() == "":
+            return
+
+        info = self.engine.order_index.lookup(self.order_str.strip())
+        if info is None:
+            self.order_info_str = "Work order " + self.order_str.strip() + " not found."
+            self.order_info_warning = True
+            return
+
+        self.order_info_str = info.customer + " - " + info.part
+        if info.length is not None:
+            expected = Length.from_inches(info.length)
+            self.order_info_str += "\nExpected " + str(expected)
+            if abs(expected - self.order_length) > self.min_tolerance:
+                #The barcode and the ERP disagree; let the operator catch it before cutting.
+                self.order_info_str += " - barcode differs!"
+                self.order_info_warning = True
+
+
+    #Check tolerance values and update the state accordingly
+    def check_tolerance(self):
+        tolerance_position: str = ""
+        if self.order_length < self.adjusted_length:
+            tolerance_position = ": Too Long"
+        elif self.order_length > self.adjusted_length:
+            tolerance_position = ": Too Short"
+
+        #Will change between green, yellow, and red based on tolerance, with text changing as well (Within/Near/Outside Tolerance)
+        if abs(self.order_difference) <= self.min_tolerance:
+            self.tolerance_indicator = "Within Tolerance"
+            self.tolerance_color = "green"
+            #Only print once the smoothed reading has stopped moving.
+            if self.laser_is_stable:
+                self.print_allowed = True
+            else:
+                self.tolerance_indicator += " (settling)"
+                self.print_allowed = False
+        elif abs(self.order_difference) <= self.max_tolerance and abs(self.order_difference) > self.min_tolerance:
+            self.tolerance_indicator = "Near Tolerance" + tolerance_position
+            self.tolerance_color = "yellow"
+            self.print_allowed = False
+        else:
+            self.tolerance_indicator = "Outside Tolerance" + tolerance_position
+            self.tolerance_color = "red"
+            self.print_allowed = False
+
+    
+    #Call this once a barcode has been detected or as the laser refreshes.
+    #Recomputes the derived lengths and tolerance, records telemetry and tells the listener.
+    #Also run if error codes are detected.
+    def refresh(self):
+        started = stage_timer.start()
+
+        #Compute adjustments; exact in hundredths, so there's nothing to round
+        self.adjusted_length = self.laser_length + self.laser_offset
+        self.order_difference = self.adjusted_length - self.order_length
+
+        #A settled reading that fits a queued order better than the current one switches to it.
+        if (self.config.queue_auto_select and self.laser_is_stable and len(self.order_queue) > 0
+                and abs(self.order_difference) > self.min_tolerance):
+            position = self.match_queued()
+            if position >= 0:
+                self.activate_queued(position)
+                self.order_difference = self.adjusted_length - self.order_length
+
+        print_allowed = self.print_allowed
+        self.check_tolerance()
+        if self.print_allowed != print_allowed:
+            self.engine.record("allowed", self.index, "1" if self.print_allowed else "0")
+
+        if self.engine.telemetry is not None:
+            self.engine.telemetry.record(self.config.name, self.order_str.strip(), self.order_length.inches,
+                                         self.laser_length.inches, self.laser_offset.inches,
+                                         self.adjusted_length.inches, self.order_difference.inches,
+                                         self.laser_is_stable, self.tolerance_color)
+        stage_timer.stop("update", started)
+        self.notify()
+
+
+    #Connection state and outage counters, e.g. "Link: connected - 2 drops, 14s down".
+    def link_summary(self):
+        downtime = self.downtime
+        if self.down_since is not None:
+            downtime += time.monotonic() - self.down_since
+        return "Link: {0} - {1} drop{2}, {3:.0f}s down".format(self.link_state, self.disconnects,
+                                                              "" if self.disconnects == 1 else "s", downtime)
+
+
+    #One line summary for the headless runner's output.
+    def status_line(self):
+        queued = ""
+        if self.config.order_queue:
+            queued = " | queue: " + (", ".join(str(order) for order in self.order_queue) or "-")
+        return "{0} | WO {1} | order {2} | table {3} | off by {4} | {5}{6} | {7} | {8} | {9}{10}".format(
+            self.config.name, self.order_str.strip() or "-", self.order_length_str,
+            self.adjusted_length, self.order_difference,
+            self.tolerance_indicator, " | print allowed" if self.print_allowed else "", self.laser_status,
+            self.print_status, self.link_summary(), queued)
+
+
+    #Ask both workers to stop; the engine joins them once every station has been asked.
+    def stop_workers(self):
+        self.complete_order()
+        self.laser_is_connected = False
+        #The worker closes the serial port once it picks up the stop command.
+        self.laser_reader.send("stop")
+        self.print_spooler.stop()
+
+
+    def join_workers(self):
+        self.laser_reader.join(timeout=1)
+        self.print_spooler.join(timeout=1)
+
+
+    def single_test(self, order_str, current_barcode, laser_length):
+        self.order_str = order_str
+        self.current_barcode = str(current_barcode)
+        self.parse_barcode()
+        self.laser_length = Length.from_inches(laser_length)
+        self.laser_is_stable = True
+        self.refresh()
+
+
+#Config, logging, shared services and the stations for one process, with no display attached.
+#Input arrives as scanner key events (key()/enter()) or whole barcodes (scan()); poll() drains the workers.
+#The Tk window and the headless runner below are both thin drivers around this.
+class MeasurementEngine:
+    barcode_decoder: BarcodeDecoder #Barcode scanner input, routed to the active station
+    order_file: str = "" #ERP order export (CSV or SQLite), relative to the exe. Blank disables lookups
+    order_index: OrderIndex | None = None
+
+    base_dir: str = "" #Directory of the exe (or script); config, logs and output files live here
+    config_path: str = ""
+    launched: float = 0.0 #time.time() the process started; see launch_time()
+    startup_stages: dict #stage -> seconds after launch, each recorded once
+
+    burst_gap_ms: int = 50 #Longest gap between scanner keystrokes. Fill this in from config file
+    min_burst_length: int = 3 #Fewest fast keys that count as a scan
+
+    #Debugging mode
+    enable_test_mode: bool = False
+    enable_telemetry: bool = False #Write one CSV row per laser update
+    telemetry: TelemetryWriter | None = None
+    log_listener: QueueListener #Writes queued log records on its own thread
+
+    enable_journal: bool = True #Record prints and completed orders in SQLite
+    journal_file: str = "wespa39-128.db" #Relative to the exe
+    journal: ProductionJournal | None = None
+    enable_trace: bool = False #Record the session for replay with wespa_trace.py
+    trace: TraceRecorder | None = None
+    log_file_handler: RotatingFileHandler
+
+    filter_settings: dict #Keyword arguments for MeasurementFilter from the [filter] section
+    station_configs: list #StationConfig per [station:N] section, or one from the single-station sections
+    stations: list #StationEngine per station config
+    active_station: StationEngine #Receives barcodes and hotkeys
+
+    #launched is the earliest time.time() the caller has; a onefile build knows better, see launch_time().
+    def __init__(self, launched: float | None = None):
+        self.launched = launch_time(launched if launched is not None else time.time())
+        self.startup_stages = {}
+        self.read_config_file()
+
+        if self.enable_telemetry:
+            self.telemetry = TelemetryWriter(self.base_dir)
+            self.telemetry.start()
+
+        if self.enable_journal:
+            self.journal = ProductionJournal(os.path.join(self.base_dir, self.journal_file))
+            self.journal.start()
+
+        if self.enable_trace:
+            header = {"started": time.time(), "burst_gap_ms": self.burst_gap_ms,
+                      "min_burst_length": self.min_burst_length, "filter_settings": self.filter_settings,
+                      "stations": [asdict(config) for config in self.station_configs]}
+            self.trace = TraceRecorder(os.path.join(self.base_dir, time.strftime('%Y-%m-%d %H%M%S') +
+                                                    ' wespa39-128 trace.gz'), header)
+            self.trace.start()
+
+        if self.order_file != "":
+            self.order_index = OrderIndex(os.path.join(self.base_dir, self.order_file))
+            self.order_index.start()
+
+        self.barcode_decoder = BarcodeDecoder(self.burst_gap_ms, self.min_burst_length)
+        self.stations = [StationEngine(self, config, i) for i, config in enumerate(self.station_configs)]
+        self.active_station = self.stations[0]
+        self.startup_stage("engine ready")
+
+
+    def read_config_file(self):
+        c = ConfigParser()
+        self.filter_settings = {}
+        self.station_configs = [StationConfig()]
+
+        #Debug / all by default, gets changed by config file when not in test mode.
+        logLevel = 10
+
+        # Resolve config file path relative to the exe (or script) location
+        if getattr(sys, 'frozen', False):
+            base_dir = os.path.dirname(sys.executable)
+        else:
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+        config_path = os.path.join(base_dir, 'wespa39-128.ini')
+        self.base_dir = base_dir
+        self.config_path = config_path
+
+        #Records are queued by the calling thread and written to a rotating file by the listener thread,
+        # so logging never waits on the disk.
+        self.log_file_handler = RotatingFileHandler(os.path.join(base_dir, 'wespa39-128.log'),
+            maxBytes=5000000, backupCount=5, delay=True)
+        self.log_file_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'))
+        log_queue = queue.Queue()
+        self.log_listener = QueueListener(log_queue, self.log_file_handler)
+        self.log_listener.start()
+        #The file handler does all the formatting. The queue handler only passes the bare message on, so it's
+        # attached directly: basicConfig() would give it BASIC_FORMAT and every line would be prefixed twice.
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.setFormatter(logging.Formatter('%(message)s'))
+        root_logger = logging.getLogger()
+        root_logger.setLevel(logLevel)
+        root_logger.addHandler(queue_handler)
+        
+        try:
+            # Set up logging first so config read errors are captured
+            c.read(config_path)
+
+            self.log_file_handler.maxBytes = c.getint('debug', 'logMaxBytes', fallback=self.log_file_handler.maxBytes)
+            self.log_file_handler.backupCount = c.getint('debug', 'logBackupCount',
+                                                         fallback=self.log_file_handler.backupCount)
+            self.enable_telemetry = c.getboolean('debug', 'enableTelemetry', fallback=self.enable_telemetry)
+            self.enable_trace = c.getboolean('debug', 'enableTrace', fallback=self.enable_trace)
+
+            stage_timer.enabled = c.getboolean('debug', 'enableTiming', fallback=False)
+            if c.has_option('debug', 'enableTestMode') and c.getboolean('debug', 'enableTestMode'):
+                #Test mode is hardcoded False by default
+                self.enable_test_mode = c.getboolean('debug', 'enableTestMode')
+            elif c.has_option('debug', 'enableLogging') and c.getboolean('debug', 'enableLogging'):
+                #If not in test mode, set log level per the config file.
+                logLevel = c.getint('debug', 'loggingLevel')
+                logging.getLogger().setLevel(logLevel)
+
+            if c.has_section('scanner'):
+                self.burst_gap_ms = c.getint('scanner', 'burstGapMs', fallback=self.burst_gap_ms)
+                self.min_burst_length = c.getint('scanner', 'minBurstLength', fallback=self.min_burst_length)
+            if c.has_option('orders', 'orderFile'):
+                self.order_file = c.get('orders', 'orderFile').strip()
+            if c.has_section('journal'):
+                self.enable_journal = c.getboolean('journal', 'enableJournal', fallback=self.enable_journal)
+                self.journal_file = c.get('journal', 'journalFile', fallback=self.journal_file).strip()
+            if c.has_section('filter'):
+                self.filter_settings = {
+                    "method": c.get('filter', 'method', fallback="median").strip().lower(),
+                    "window_size": c.getint('filter', 'windowSize', fallback=10),
+                    "stable_samples": c.getint('filter', 'stableSamples', fallback=3),
+                    "stable_spread": c.getfloat('filter', 'stableSpread', fallback=0.05),
+                    "outlier_threshold": c.getfloat('filter', 'outlierThreshold', fallback=3.0),
+                    "ema_alpha": c.getfloat('filter', 'emaAlpha', fallback=0.3),
+                    "trim_fraction": c.getfloat('filter', 'trimFraction', fallback=0.2),
+                }
+                #Either mistake would keep every reading unsettled, and printing locked, without saying why.
+                if self.filter_settings["stable_samples"] < 1:
+                    logging.error("stableSamples = %d in [filter] must be at least 1, using 1.",
+                                  self.filter_settings["stable_samples"])
+                    self.filter_settings["stable_samples"] = 1
+                if self.filter_settings["window_size"] < self.filter_settings["stable_samples"]:
+                    logging.error("windowSize = %d in [filter] is smaller than stableSamples, using %d.",
+                                  self.filter_settings["window_size"], self.filter_settings["stable_samples"])
+                    self.filter_settings["window_size"] = self.filter_settings["stable_samples"]
+            self.station_configs = read_station_configs(c)
+
+        except Exception as e:
+            logging.error("Error reading config file: %s", e)
+            logging.error("Using default config values.")
+
+        logging.info("Config file loaded: %d station(s).", len(self.station_configs))
+
+
+    #Log how long after launch a startup stage was reached (once per stage), and time it with enableTiming.
+    def startup_stage(self, stage: str):
+        if stage in self.startup_stages:
+            return
+        elapsed = time.time() - self.launched
+        self.startup_stages[stage] = elapsed
+        if stage_timer.enabled:
+            stage_timer.record("startup: " + stage, elapsed)
+        logging.warning("Startup: %s after %.2fs", stage, elapsed)
+
+
+    #Save a port found by autodiscovery as the station's laserComPort, so the next start connects straight away.
+    #Returns True if the .ini was updated.
+    def remember_port(self, station: StationEngine, port: str):
+        logging.warning("Laser for %s found on %s instead of %s", station.config.name, port, station.config.laser_port)
+        station.config.laser_port = port
+        try:
+            update_ini_option(self.config_path, station.config.section, "laserComPort", port)
+            return True
+        except OSError as e:
+            logging.error("Error saving laserComPort: %s", e)
+            return False
+
+
+    #Add an event to the session trace, if one is being recorded. Thread-safe.
+    def record(self, kind: str, station: int, payload=b""):
+        if self.trace is not None:
+            self.trace.record(kind, station, payload)
+
+
+    #Connect every station's laser; polling starts once each is connected unless in test mode.
+    def start(self):
+        for station in self.stations:
+            station.start(poll=not self.enable_test_mode)
+
+
+    #Route the scanner and hotkeys to another station. Returns True if the active station changed.
+    def select_station(self, index: int):
+        if index < 0 or index >= len(self.stations) or self.stations[index] is self.active_station:
+            return False
+        self.active_station = self.stations[index]
+        self.record("station", index)
+        logging.info("Active station: %s", self.active_station.config.name)
+        return True
+
+
+    #Drain readings and print results posted by every station's workers.
+    def poll(self):
+        for station in self.stations:
+            station.process_laser_readings()
+            station.process_print_results()
+
+
+    #One digit or '.' from the scanner (or keyboard), with the key event's time in ms.
+    def key(self, char: str, event_time: int):
+        self.record("key", self.active_station.index, char + str(event_time))
+        self.barcode_decoder.key(char, event_time)
+
+
+    #End of a scan. Returns the station its queued scans belong to, to hand to process_scans(), or None.
+    #A rejected burst is shown on the active station straight away.
+    def enter(self, event_time: int, started: float = 0.0):
+        self.record("enter", self.active_station.index, str(event_time))
+        scan = self.barcode_decoder.enter(event_time)
+        station = self.active_station
+        if scan is None:
+            return None
+        if scan.error != "":
+            self.reject_scan(station, scan.error)
+            return None
+        station.barcode_scan_time = started
+        return station
+
+
+    #Show why a barcode was rejected on the station it was scanned at; the current order is left alone.
+    def reject_scan(self, station: StationEngine, error: str):
+        station.order_info_str = error
+        station.order_info_warning = True
+        station.refresh()
+
+
+    #Apply queued scans in the order they arrived, on the station that was active when they finished.
+    def process_scans(self, station: StationEngine):
+        while len(self.barcode_decoder.scans) > 0:
+            scan = self.barcode_decoder.scans.popleft()
+            station.scan_barcode(scan.text)
+        station.refresh()
+
+
+    #A whole barcode at once, from a line on stdin or a socket rather than key events.
+    def scan(self, text: str):
+        station = self.active_station
+        self.record("scan", station.index, text)
+        error = barcode_error(text)
+        if error != "":
+            logging.error(error)
+            self.reject_scan(station, error)
+            return
+        logging.info("Received %s input: %s", split_barcode(text)[0], text)
+        station.barcode_scan_time = stage_timer.start()
+        station.scan_barcode(text)
+        station.refresh()
+
+
+    def clear_barcode(self):
+        self.barcode_decoder.clear()
+        self.active_station.clear_barcode()
+
+
+    #Write the stage timing histograms next to the exe (t key, and on exit). Does nothing unless enableTiming is set.
+    def dump_timings(self):
+        stage_timer.dump(os.path.join(self.base_dir, time.strftime('%Y-%m-%d %H%M%S') + ' wespa39-128 timings.txt'))
+
+
+    #Stop every worker and flush the journal and log. The engine can't be used afterwards.
+    def stop(self):
+        logging.warning("Closing serial ports and program...")
+        self.dump_timings()
+        #Stop tracing laser bytes, then take in the readings already traced, so a replay never sees a reading
+        # (and a print button change) this session didn't.
+        if self.trace is not None:
+            for station in self.stations:
+                station.laser_reader.trace = None
+                station.process_laser_readings()
+        #Every station is asked to stop before any is waited on, so they shut down together.
+        for station in self.stations:
+            station.stop_workers()
+        for station in self.stations:
+            station.join_workers()
+        if self.telemetry is not None:
+            self.telemetry.stop()
+            self.telemetry.join(timeout=1)
+        if self.journal is not None:
+            self.journal.stop()
+            self.journal.join(timeout=2)
+        if self.trace is not None:
+            self.trace.stop()
+            self.trace.join(timeout=2)
+        if self.order_index is not None:
+            self.order_index.stop()
+
+        #Last, so the shutdown messages above make it to the file.
+        self.log_listener.stop()
+
+
+#Feeds barcode lines to a headless engine and prints each station's state as it changes.
+#Lines come from stdin and/or a TCP port, one barcode per line. A few words stand in for the GUI's hotkeys:
+# "clear", "print [copies]", "reset", "poll", "station N" (1-based), "reprint [WO ...] [xN]",
+# and in queue mode "select N" and "clear queue".
+class HeadlessRunner:
+    poll_interval: float = 0.02 #Longest wait for input before draining the workers again
+
+    def __init__(self, engine: MeasurementEngine, auto_print: bool = False, quiet: bool = False):
+        self.engine = engine
+        self.auto_print = auto_print #Print once per barcode as soon as printing is allowed, for unattended stations
+        self.quiet = quiet
+        self.lines = queue.Queue()
+        self.last_lines = {} #station index -> last status line written
+        self.auto_printed = {} #station index -> order_scanned_at of the last barcode auto-printed
+        self.server = None
+        for station in engine.stations:
+            station.listener = self.on_change
+
+
+    def on_change(self, station: StationEngine):
+        if (self.auto_print and station.print_allowed and station.order_labels_sent == 0
+                and self.auto_printed.get(station.index) != station.order_scanned_at):
+            #Once per barcode, even if the printer was busy; "print" retries by hand.
+            self.auto_printed[station.index] = station.order_scanned_at
+            station.print_label()
+            return
+        if self.quiet:
+            return
+        line = station.status_line()
+        #Laser ticks mostly repeat the same state; only write changes.
+        if self.last_lines.get(station.index) != line:
+            self.last_lines[station.index] = line
+            print(line, flush=True)
+
+
+    def read_stdin(self):
+        for line in sys.stdin:
+            self.lines.put(line)
+        self.lines.put(None)
+
+
+    #Each connection may send any number of lines; the listening socket stays open until shutdown.
+    def serve(self, host: str, port: int):
+        lines = self.lines
+
+        class LineHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    lines.put(line.decode("utf-8", "replace"))
+
+        self.server = socketserver.ThreadingTCPServer((host, port), LineHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="HeadlessServer", daemon=True).start()
+        logging.info("Listening for barcodes on %s:%d", host, port)
+
+
+    def handle_line(self, line: str):
+        text = line.strip()
+        words = text.lower().split()
+        station = self.engine.active_station
+        if text == "":
+            return
+        elif words[0] == "station" and len(words) == 2 and words[1].isdigit():
+            self.engine.select_station(int(words[1]) - 1)
+        elif words[0] == "select" and len(words) == 2 and words[1].isdigit():
+            station.select_queued(int(words[1]) - 1)
+            station.refresh()
+        elif words == ["clear", "queue"]:
+            station.clear_queue()
+        elif text.lower() == "clear":
+            self.engine.clear_barcode()
+        elif words[0] == "print" and len(words) <= 2 and all(word.isdigit() for word in words[1:]):
+            if len(words) == 2:
+                station.set_label_copies(int(words[1]))
+            station.print_label()
+        elif words[0] == "reprint":
+            #"reprint [WO ...] [xN]": the last label, or the latest of each work order, N copies each
+            copies = 1
+            if len(words) > 1 and words[-1][0] == "x" and words[-1][1:].isdigit():
+                copies = int(words.pop()[1:])
+            if len(words) == 1:
+                station.reprint_last(copies)
+            else:
+                station.reprint_orders(words[1:], copies)
+        elif text.lower() == "reset":
+            station.reset_laser()
+        elif text.lower() == "poll":
+            station.get_laser_length()
+        else:
+            self.engine.scan(text)
+
+
+    #Runs until stdin closes (when reading it) or Ctrl+C.
+    def run(self, use_stdin: bool = True):
+        if use_stdin:
+            threading.Thread(target=self.read_stdin, name="HeadlessStdin", daemon=True).start()
+        self.engine.start()
+        try:
+            while True:
+                try:
+                    line = self.lines.get(timeout=self.poll_interval)
+                except queue.Empty:
+                    line = ""
+                if line is None:
+                    break
+                self.handle_line(line)
+                self.engine.poll()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.server is not None:
+                self.server.shutdown()
+            #Let queued labels reach the printer before the workers stop.
+            self.engine.poll()
+            self.engine.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run WESPA 39-128 stations without a display.")
+    parser.add_argument("--listen", metavar="HOST:PORT", help="also read barcode lines from this TCP address")
+    parser.add_argument("--no-stdin", action="store_true", help="don't read barcodes from stdin (daemon use)")
+    parser.add_argument("--auto-print", action="store_true", help="print once per barcode when in tolerance")
+    parser.add_argument("--quiet", action="store_true", help="don't write status lines")
+    args = parser.parse_args()
+
+    runner = HeadlessRunner(MeasurementEngine(), args.auto_print, args.quiet)
+    if args.listen:
+        host, _, port = args.listen.rpartition(":")
+        runner.serve(host or "127.0.0.1", int(port))
+    elif args.no_stdin:
+        parser.error("--no-stdin needs --listen")
+    runner.run(not args.no_stdin)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import time
+import urllib.request
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from configparser import ConfigParser
+
+#Cut accuracy report over the production journal (wespa39-128.db), per shift and per work order.
+#Reads the prints table in one query and does the statistics with numpy, so months of history take seconds.
+#Writes "<prefix> shifts.csv" and "<prefix> orders.csv" (and .parquet when pyarrow is installed).
+#
+#Examples:
+#   python wespa_report.py
+#   python wespa_report.py --since 2026-09-01 --until 2026-10-01 --station "Table 2" --parquet
+#   python wespa_report.py --journal \\server\line39\wespa39-128.db --shifts 7,19
+
+#Bands the journal records, in report column order
+TOLERANCE_BANDS = ["green", "yellow", "red"]
+
+
+#Directory holding the exe (or this script) and so the .ini and journal
+def base_directory() -> str:
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+#Journal path and shift start hours from the .ini, or the defaults if it isn't there
+def read_report_config(base_dir: str) -> tuple:
+    journal_file = "wespa39-128.db"
+    shift_starts = "6,14,22"
+    c = ConfigParser()
+    c.read(os.path.join(base_dir, 'wespa39-128.ini'))
+    if c.has_section('journal'):
+        journal_file = c.get('journal', 'journalFile', fallback=journal_file).strip() or journal_file
+        shift_starts = c.get('journal', 'shiftStarts', fallback=shift_starts)
+    return os.path.join(base_dir, journal_file), parse_shift_starts(shift_starts)
+
+
+#"6,14,22" -> [6, 14, 22]; hours of the day each shift starts, local time
+def parse_shift_starts(text: str) -> list:
+    starts = sorted({int(hour) for hour in text.replace(";", ",").split(",") if hour.strip()})
+    if not starts or starts[0] < 0 or starts[-1] > 23:
+        raise ValueError("shift start hours must be 0-23, got {0!r}".format(text))
+    return starts
+
+
+#Every measured print in [since, until) as columns. SQLite converts to local wall-clock seconds in the same pass.
+def load_prints(path: str, since: float | None = None, until: float | None = None,
+                station: str | None = None) -> dict:
+    query = ("SELECT printed_at, CAST(strftime('%s', printed_at, 'unixepoch', 'localtime') AS INTEGER),"
+             " COALESCE(station, ''), COALESCE(work_order, ''), order_difference, COALESCE(tolerance_band, '')"
+             " FROM prints WHERE order_difference IS NOT NULL")
+    params = []
+    if since is not None:
+        query += " AND printed_at >= ?"
+        params.append(since)
+    if until is not None:
+        query += " AND printed_at < ?"
+        params.append(until)
+    if station is not None:
+        query += " AND station = ?"
+        params.append(station)
+    query += " ORDER BY printed_at"
+
+    #pathname2url() escapes #, ? and % in the path, and turns a UNC share into file:////server/share/...
+    connection = sqlite3.connect("file:" + urllib.request.pathname2url(os.path.abspath(path)) + "?mode=ro", uri=True)
+    try:
+        rows = connection.execute(query, params).fetchall()
+    finally:
+        connection.close()
+
+    columns = list(zip(*rows)) or [()] * 6
+    return {
+        "printed_at": np.array(columns[0], dtype=np.float64),
+        "local_time": np.array(columns[1], dtype=np.int64),
+        "station": np.array(columns[2], dtype=str),
+        "work_order": np.array(columns[3], dtype=str),
+        "order_difference": np.array(columns[4], dtype=np.float64),
+        "tolerance_band": np.array(columns[5], dtype=str),
+    }
+
+
+#Shift each print falls in: (date the shift started, index into shift_starts).
+#A print before the first start hour belongs to the previous day's last shift.
+def assign_shifts(local_time: np.ndarray, shift_starts: list) -> tuple:
+    day = local_time // 86400
+    index = np.searchsorted(np.array(shift_starts) * 3600, local_time % 86400, side="right") - 1
+    overnight = index < 0
+    index[overnight] = len(shift_starts) - 1
+    day[overnight] -= 1
+    return day, index
+
+
+#Count, mean, stddev, min, max, band shares and drift of order_difference for each group id in 0..groups-1
+def group_statistics(group: np.ndarray, groups: int, prints: dict) -> dict:
+    difference = prints["order_difference"]
+    printed_at = prints["printed_at"]
+    count = np.bincount(group, minlength=groups).astype(np.float64)
+    mean = np.bincount(group, weights=difference, minlength=groups) / count
+    deviation = difference - mean[group]
+    std = np.sqrt(np.bincount(group, weights=deviation * deviation, minlength=groups) / count)
+
+    #Sorted by group then difference, the first and last row of each group are its min and max
+    order = np.lexsort((difference, group))
+    first = np.searchsorted(group[order], np.arange(groups), side="left")
+    last = np.searchsorted(group[order], np.arange(groups), side="right") - 1
+    #Same again by group then time for each group's earliest print
+    by_time = np.lexsort((printed_at, group))
+    earliest = np.searchsorted(group[by_time], np.arange(groups), side="left")
+
+    #Least squares slope of difference against time within each group, inches per hour
+    hours = printed_at / 3600.0
+    hours_centered = hours - (np.bincount(group, weights=hours, minlength=groups) / count)[group]
+    spread = np.bincount(group, weights=hours_centered * hours_centered, minlength=groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drift = np.where(spread > 0, np.bincount(group, weights=hours_centered * deviation, minlength=groups) / spread,
+                         np.nan)
+
+    statistics = {
+        "first_print": printed_at[by_time[earliest]],
+        "cuts": count.astype(np.int64),
+        "mean_difference": mean,
+        "std_difference": std,
+        "min_difference": difference[order[first]],
+        "max_difference": difference[order[last]],
+    }
+    for band in TOLERANCE_BANDS:
+        statistics[band] = np.bincount(group, weights=prints["tolerance_band"] == band, minlength=groups) / count
+    statistics["drift_per_hour"] = drift
+    return statistics
+
+
+#One row per station and shift
+def shift_report(prints: dict, shift_starts: list) -> dict:
+    day, index = assign_shifts(prints["local_time"], shift_starts)
+    stations, station_code = np.unique(prints["station"], return_inverse=True)
+    day_offset = day - (day.min() if day.size else 0)
+    key = (station_code * (day_offset.max() + 1 if day.size else 1) + day_offset) * len(shift_starts) + index
+    keys, group = np.unique(key, return_inverse=True)
+    first = np.unique(group, return_index=True)[1]
+
+    report = {
+        "station": stations[station_code[first]],
+        "shift_date": (day[first].astype("datetime64[D]")).astype(str),
+        "shift_start": np.array(["{0:02d}:00".format(shift_starts[i]) for i in index[first]], dtype=str),
+    }
+    report.update(group_statistics(group, keys.size, prints))
+    return report
+
+
+#One row per work order, over every station that cut it
+def order_report(prints: dict) -> dict:
+    work_orders, group = np.unique(prints["work_order"], return_inverse=True)
+    report = {"work_order": work_orders}
+    report.update(group_statistics(group, work_orders.size, prints))
+    report.pop("drift_per_hour")
+    return report
+
+
+#CSV with times as local "YYYY-MM-DD HH:MM:SS" and lengths rounded to 0.0001 in
+def write_csv(path: str, report: dict):
+    columns = []
+    for name, values in report.items():
+        if name == "first_print":
+            values = [time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(value)) for value in values]
+        elif values.dtype.kind == "f":
+            values = np.round(values, 4).tolist()
+        else:
+            values = values.tolist()
+        columns.append(values)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(report))
+        writer.writerows(zip(*columns))
+
+
+def write_parquet(path: str, report: dict):
+    table = pyarrow.table({name: values for name, values in report.items()})
+    pyarrow.parquet.write_table(table, path)
+
+
+def parse_date(text: str) -> float:
+    return time.mktime(time.strptime(text, "%Y-%m-%d"))
+
+
+def main():
+    base_dir = base_directory()
+    journal_file, shift_starts = read_report_config(base_dir)
+
+    parser = argparse.ArgumentParser(description="Per-shift and per-order cut accuracy from the WESPA 39-128 journal.")
+    parser.add_argument("--journal", default=journal_file, help="journal database (default: journalFile in the .ini)")
+    parser.add_argument("--since", type=parse_date, metavar="YYYY-MM-DD", help="first day to include")
+    parser.add_argument("--until", type=parse_date, metavar="YYYY-MM-DD", help="day to stop before")
+    parser.add_argument("--station", help="only this station's prints")
+    parser.add_argument("--shifts", type=parse_shift_starts, default=shift_starts, metavar="H,H,...",
+                        help="hours each shift starts (default: shiftStarts in the .ini, or 6,14,22)")
+    parser.add_argument("--out", default=base_dir, help="directory for the report files")
+    parser.add_argument("--prefix", default=time.strftime("%Y-%m-%d") + " wespa39-128",
+                        help="start of the report file names")
+    parser.add_argument("--parquet", action="store_true", help="also write .parquet files (needs pyarrow)")
+    args = parser.parse_args()
+    if args.parquet and pyarrow is None:
+        parser.error("--parquet needs pyarrow (pip install pyarrow)")
+    if not os.path.exists(args.journal):
+        parser.error("no journal at {0}".format(args.journal))
+
+    start = time.perf_counter()
+    try:
+        prints = load_prints(args.journal, args.since, args.until, args.station)
+    except sqlite3.Error as e:
+        parser.error("can't read prints from {0}: {1}".format(args.journal, e))
+    loaded = time.perf_counter()
+    reports = {"shifts": shift_report(prints, args.shifts), "orders": order_report(prints)}
+    for name, report in reports.items():
+        path = os.path.join(args.out, "{0} {1}".format(args.prefix, name))
+        write_csv(path + ".csv", report)
+        if args.parquet:
+            write_parquet(path + ".parquet", report)
+        print("{0}.csv: {1} rows".format(path, report["cuts"].size))
+
+    cuts = prints["order_difference"]
+    if cuts.size:
+        print("{0} cuts, mean difference {1:+.3f} in, stddev {2:.3f} in, {3:.1%} green".format(
+            cuts.size, cuts.mean(), cuts.std(), np.mean(prints["tolerance_band"] == "green")))
+    print("read {0:.2f}s, report {1:.2f}s".format(loaded - start, time.perf_counter() - loaded))
+
+
+if __name__ == "__main__":
+    main()
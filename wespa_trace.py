@@ -0,0 +1,389 @@
+import argparse
+import gzip
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from dataclasses import asdict, dataclass, field, fields, replace
+from wespa_engine import (BarcodeDecoder, LaserFrameParser, LaserReader, LaserReading, MeasurementEngine,
+                          PrintResult, StationConfig, StationEngine, TraceRecorder, decode_trace_payload,
+                          encode_trace_payload, format_hundredths, frame_reading, parse_laser_error)
+
+#Replays sessions recorded with enableTrace = True (or made up by "synth") through the same barcode, laser,
+#tolerance and print code the window runs, as fast as the CPU allows, and checks the outputs still match:
+#every recorded label must print again with the same ZPL, and the print button must turn on and off the same way.
+#
+#Examples:
+#   python wespa_trace.py replay "2026-10-17 061502 wespa39-128 trace.gz"
+#   python wespa_trace.py synth shift.trace.gz --hours 8 --rate 10
+#   python wespa_trace.py bench --hours 8    (readings/s, scan to print enabled, memory over the shift)
+
+
+#Stands in for PrintSpooler during a replay: every label "prints" at once, and its ZPL is kept for checking.
+class ReplaySpooler:
+    def __init__(self, results):
+        self.results = results
+        self.last_data = b""
+
+
+    def submit(self, job):
+        self.last_data = job.data
+        self.results.put(PrintResult(job.job_id, job.name, True, "Printed " + job.name))
+        return True
+
+
+    def stop(self):
+        pass
+
+
+    def join(self, timeout=None):
+        pass
+
+
+#A MeasurementEngine built from a trace header instead of the .ini: no journal, telemetry, log file or printer,
+# and the laser workers are never connected. Everything from the decoder to the print button is the real code.
+class ReplayEngine(MeasurementEngine):
+    def __init__(self, header: dict):
+        self.launched = time.time()
+        self.startup_stages = {}
+        self.burst_gap_ms = header.get("burst_gap_ms", self.burst_gap_ms)
+        self.min_burst_length = header.get("min_burst_length", self.min_burst_length)
+        self.filter_settings = header.get("filter_settings", {})
+        names = {f.name for f in fields(StationConfig)}
+        self.station_configs = [replace(StationConfig(**{k: v for k, v in config.items() if k in names}),
+                                        printer_backend="null", auto_discover=False)
+                                for config in header.get("stations", [asdict(StationConfig())])]
+
+        self.barcode_decoder = BarcodeDecoder(self.burst_gap_ms, self.min_burst_length)
+        self.stations = [StationEngine(self, config, i) for i, config in enumerate(self.station_configs)]
+        self.active_station = self.stations[0]
+        for station in self.stations:
+            station.print_spooler.stop()
+            station.print_spooler.join(timeout=1)
+            station.print_spooler = ReplaySpooler(station.print_results)
+
+
+    def startup_stage(self, stage: str):
+        pass
+
+
+    def remember_port(self, station: StationEngine, port: str):
+        return False
+
+
+    def stop(self):
+        for station in self.stations:
+            station.laser_reader.send("stop")
+        for station in self.stations:
+            station.laser_reader.join(timeout=1)
+
+
+#What a replay found and how long it took.
+@dataclass
+class ReplayResult:
+    events: int = 0
+    readings: int = 0 #Laser frames fed through the filter
+    labels: int = 0
+    seconds: float = 0.0 #Wall clock time of the replay
+    trace_seconds: float = 0.0 #Length of the session being replayed
+    mismatches: list = field(default_factory=list) #Human readable; empty if the outputs matched
+    scan_latency: list = field(default_factory=list) #Trace seconds from each scan to the print button enabling
+    scan_cost: list = field(default_factory=list) #Wall clock seconds spent handling each scan
+    memory: list = field(default_factory=list) #(trace hours, bytes held by wespa_engine code), with memory tracking on
+
+
+#(header, iterator of (seconds, kind, station, payload bytes)) from a trace file. Lines are read lazily.
+def read_trace(path: str):
+    f = gzip.open(path, "rt", encoding="ascii") if path.endswith(".gz") else open(path, "r", encoding="ascii")
+    first = f.readline()
+    if not first.startswith("#wespa-trace "):
+        f.close()
+        raise ValueError(path + " is not a wespa39-128 trace")
+    version, _, header = first[len("#wespa-trace "):].partition(" ")
+    if int(version) > TraceRecorder.version:
+        f.close()
+        raise ValueError("{0} is trace version {1}, this replays up to {2}".format(path, version,
+                                                                                  TraceRecorder.version))
+
+    def events():
+        with f:
+            for line in f:
+                t, kind, station, payload = line.rstrip("\n").split("\t", 3)
+                yield float(t), kind, int(station), decode_trace_payload(payload)
+
+    return json.loads(header), events()
+
+
+#Bytes currently allocated from wespa_engine.py, so the replay's own bookkeeping doesn't count.
+def engine_memory():
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, "*wespa_engine.py")])
+    return sum(stat.size for stat in snapshot.statistics("filename"))
+
+
+def write_trace(path: str, header: dict, events):
+    with gzip.open(path, "wt", encoding="ascii", newline="\n") as f:
+        f.write("#wespa-trace {0} {1}\n".format(TraceRecorder.version, json.dumps(header)))
+        for t, kind, station, payload in events:
+            f.write("{0:.4f}\t{1}\t{2}\t{3}\n".format(t, kind, station, encode_trace_payload(payload)))
+
+
+#Feed a session through a ReplayEngine. Laser bytes go through the frame parser and apply_reading() just as
+# the worker would post them, and each chunk is drained and filtered like one GUI poll.
+#A DM/DS chunk is one reply, handled like LaserReader.measure(): a fresh parse, only the last frame posted,
+# and an error reading when no frame came back (or the link dropping after max_missed_readings of those).
+def replay(header: dict, events, track_memory: bool = False):
+    engine = ReplayEngine(header)
+    parsers = [LaserFrameParser() for station in engine.stations]
+    polled = [station.config.laser_mode in ("DM", "DS") for station in engine.stations]
+    missed_readings = [0 for station in engine.stations]
+    recorded_allowed = [[] for station in engine.stations]
+    replayed_allowed = [[] for station in engine.stations]
+    scanned_at = [None for station in engine.stations] #Trace time of the last scan still waiting for the print button
+    result = ReplayResult()
+    next_memory_sample = 0.0
+    if track_memory:
+        tracemalloc.start()
+
+    started = time.perf_counter()
+    for t, kind, index, payload in events:
+        result.events += 1
+        result.trace_seconds = t
+        if index >= len(engine.stations):
+            result.mismatches.append("{0:.3f}s: event for station {1}, trace has {2}".format(t, index + 1,
+                                                                                            len(engine.stations)))
+            continue
+        station = engine.stations[index]
+        allowed = station.print_allowed
+        scan_started = None
+
+        if kind == "serial":
+            if polled[index]:
+                parsers[index].clear()
+            frames = parsers[index].feed(payload)
+            if not polled[index]:
+                readings = [LaserReading(t, True, *frame_reading(frame), link_state="connected") for frame in frames]
+            elif len(frames) > 0:
+                missed_readings[index] = 0
+                readings = [LaserReading(t, True, *frame_reading(frames[-1]), link_state="connected")]
+            else:
+                missed_readings[index] += 1
+                if missed_readings[index] >= LaserReader.max_missed_readings:
+                    #The worker reconnects before its next DM, which starts the count again.
+                    missed_readings[index] = 0
+                    readings = [LaserReading(t, False, "Laser offline (no answer).", link_state="reconnecting")]
+                else:
+                    readings = [LaserReading(t, True, parse_laser_error(""), 0.0, True, link_state="connected")]
+            new_sample = False
+            for reading in readings:
+                new_sample = station.apply_reading(reading) or new_sample
+            result.readings += len(readings)
+            if new_sample:
+                station.filter_samples()
+            if len(readings) > 0:
+                station.refresh()
+        elif kind == "key":
+            text = payload.decode("utf-8")
+            engine.active_station = station
+            engine.key(text[0], int(text[1:]))
+        elif kind == "enter":
+            engine.active_station = station
+            scan_started = time.perf_counter()
+            target = engine.enter(int(payload))
+            if target is not None:
+                engine.process_scans(target)
+        elif kind == "scan":
+            engine.active_station = station
+            scan_started = time.perf_counter()
+            engine.scan(payload.decode("utf-8"))
+        elif kind == "station":
+            engine.select_station(index)
+        elif kind == "clear":
+            engine.barcode_decoder.clear()
+            station.clear_barcode()
+        elif kind == "select":
+            station.select_queued(int(payload))
+            station.refresh()
+        elif kind == "clear_queue":
+            station.clear_queue()
+        elif kind == "copies":
+            station.set_label_copies(int(payload))
+        elif kind == "reprint":
+            #Reprints by work order read the journal, which isn't part of the trace; only the last label is replayed.
+            station.reprint_last(int(payload))
+            station.process_print_results()
+        elif kind == "print":
+            if not station.print_label():
+                result.mismatches.append("{0:.3f}s: {1} label printed in the session but not allowed now".format(
+                    t, station.config.name))
+            elif len(payload) > 0 and station.print_spooler.last_data != payload:
+                result.mismatches.append("{0:.3f}s: {1} label differs\n  was {2!r}\n  now {3!r}".format(
+                    t, station.config.name, payload, station.print_spooler.last_data))
+            else:
+                result.labels += 1
+            station.process_print_results()
+        elif kind == "allowed":
+            recorded_allowed[index].append((payload == b"1", t))
+
+        if scan_started is not None:
+            result.scan_cost.append(time.perf_counter() - scan_started)
+            scanned_at[index] = t
+        if station.print_allowed != allowed:
+            replayed_allowed[index].append((station.print_allowed, t))
+            if station.print_allowed and scanned_at[index] is not None:
+                result.scan_latency.append(t - scanned_at[index])
+                scanned_at[index] = None
+        if track_memory and t >= next_memory_sample:
+            result.memory.append((t / 3600.0, engine_memory()))
+            next_memory_sample += 3600.0
+
+    result.seconds = time.perf_counter() - started
+    if track_memory:
+        result.memory.append((result.trace_seconds / 3600.0, engine_memory()))
+        tracemalloc.stop()
+    engine.stop()
+
+    #Synthetic traces carry no "allowed" events, so there is nothing to compare against.
+    for station, recorded, replayed in zip(engine.stations, recorded_allowed, replayed_allowed):
+        if len(recorded) == 0:
+            continue
+        for i, (was, now) in enumerate(zip(recorded, replayed)):
+            if was[0] != now[0]:
+                result.mismatches.append("{0}: print button change {1} was {2} at {3:.3f}s, now {4} at {5:.3f}s".format(
+                    station.config.name, i + 1, "on" if was[0] else "off", was[1], "on" if now[0] else "off", now[1]))
+                break
+        else:
+            if len(recorded) != len(replayed):
+                result.mismatches.append("{0}: print button changed {1} times in the session, {2} now".format(
+                    station.config.name, len(recorded), len(replayed)))
+    return result
+
+
+#A made-up shift on one station: scan an order, the table moves to the new length and settles, then either the
+#label prints (when the cut is clearly in tolerance) or the order is cleared. The laser streams rate frames a second.
+def synthesize(hours: float = 8.0, rate: float = 10.0, seed: int = 1, noise: float = 0.0002,
+               error_rate: float = 0.002):
+    rng = random.Random(seed)
+    config = replace(StationConfig(), laser_mode="DT", printer_backend="null")
+    header = {"started": time.time(), "synthetic": True, "burst_gap_ms": 50, "min_burst_length": 3,
+              "filter_settings": {}, "stations": [asdict(config)]}
+
+    def events():
+        t = 0.0
+        step = 1.0 / rate
+        table = 120.0 #Inches
+        end = hours * 3600.0
+
+        #An error code restarts the filter, so none are sent just before a label is due.
+        def hold(target: float, seconds: float, errors: bool = True):
+            nonlocal t
+            for i in range(int(seconds * rate)):
+                t += step
+                if errors and rng.random() < error_rate:
+                    yield t, "serial", 0, b"E16\r\n"
+                else:
+                    meters = target / 39.3701 + rng.gauss(0.0, noise)
+                    yield t, "serial", 0, "{0:.4f}\r\n".format(meters).encode("ascii")
+
+        while t < end:
+            order_length = round(rng.uniform(36.0, 480.0), 1)
+            barcode = "{0:04d}{1:.1f}".format(rng.randint(0, 9999), order_length)
+            yield from hold(table, rng.uniform(2.0, 10.0))
+            key_time = int(t * 1000)
+            for char in barcode:
+                key_time += 4
+                yield t, "key", 0, (char + str(key_time)).encode("ascii")
+            yield t, "enter", 0, str(key_time + 4).encode("ascii")
+
+            #Move the stop, in about 5 steps a second, then let it settle a little off the order length.
+            miss = rng.gauss(0.0, 0.04) if rng.random() < 0.9 else rng.uniform(-3.0, 3.0)
+            target = order_length + miss
+            travel = rng.uniform(3.0, 8.0)
+            moves = int(travel * 5)
+            for i in range(1, moves + 1):
+                yield from hold(table + (target - table) * i / moves, 0.2)
+            table = target
+            yield from hold(table, 1.0)
+            yield from hold(table, 1.0, errors=False)
+            if abs(miss) < 0.06:
+                for copy in range(2 if rng.random() < 0.1 else 1):
+                    yield t, "print", 0, b""
+                    yield from hold(table, 0.5, errors=False)
+            yield from hold(table, 1.0)
+            yield t, "clear", 0, b""
+
+    return header, events()
+
+
+def summarize(name: str, values: list, scale: float = 1000.0, unit: str = "ms"):
+    if len(values) == 0:
+        print("{0:<28} no samples".format(name))
+        return
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    print("{0:<28} n={1:<6} median {2:8.2f}{5}  p95 {3:8.2f}{5}  max {4:8.2f}{5}".format(
+        name, len(values), statistics.median(values) * scale, p95 * scale, values[-1] * scale, unit))
+
+
+def report(name: str, result: ReplayResult):
+    print("{0}: {1} events, {2} readings, {3} labels, {4:.1f}h of trace in {5:.2f}s ({6:.0f} readings/s)".format(
+        name, result.events, result.readings, result.labels, result.trace_seconds / 3600.0, result.seconds,
+        result.readings / result.seconds if result.seconds > 0 else 0.0))
+    for mismatch in result.mismatches[:20]:
+        print("  MISMATCH " + mismatch)
+    if len(result.mismatches) > 20:
+        print("  ... {0} more".format(len(result.mismatches) - 20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record/replay checks and benchmarks for wespa39-128.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay_parser = commands.add_parser("replay", help="replay traces and check the labels and print button")
+    replay_parser.add_argument("traces", nargs="+")
+    synth_parser = commands.add_parser("synth", help="write a synthetic shift as a trace file")
+    synth_parser.add_argument("output")
+    bench_parser = commands.add_parser("bench", help="time a synthetic shift: readings/s, scan latency, memory")
+    for command in (synth_parser, bench_parser):
+        command.add_argument("--hours", type=float, default=8.0)
+        command.add_argument("--rate", type=float, default=10.0, help="laser frames per second")
+        command.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    #The replayed code logs every laser error code; only the results matter here.
+    logging.basicConfig(level=logging.CRITICAL)
+
+    if args.command == "synth":
+        header, events = synthesize(args.hours, args.rate, args.seed)
+        write_trace(args.output, header, events)
+        print("Wrote " + args.output)
+        return 0
+
+    if args.command == "replay":
+        failed = False
+        for path in args.traces:
+            result = replay(*read_trace(path))
+            report(path, result)
+            summarize("scan to print enabled", result.scan_latency, 1.0, "s")
+            failed = failed or len(result.mismatches) > 0
+        return 1 if failed else 0
+
+    result = replay(*synthesize(args.hours, args.rate, args.seed))
+    report("synthetic {0:g}h shift".format(args.hours), result)
+    summarize("scan handling", result.scan_cost)
+    summarize("scan to print enabled", result.scan_latency, 1.0, "s")
+
+    #Memory tracking slows everything down, so it gets a pass of its own.
+    memory = replay(*synthesize(args.hours, args.rate, args.seed), track_memory=True).memory
+    for hours, size in memory:
+        print("memory at {0:4.1f}h: {1:8.1f} KiB".format(hours, size / 1024.0))
+    if len(memory) > 2:
+        print("growth after the first hour: {0:+.1f} KiB (the length format cache holds up to {1} strings)".format(
+            (memory[-1][1] - memory[1][1]) / 1024.0, format_hundredths.cache_info().maxsize))
+    return 1 if len(result.mismatches) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())